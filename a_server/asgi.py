@@ -13,4 +13,10 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'a_server.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up, it needs the app registry
+from test_app.live import LiveQuizApplication  # noqa: E402
+
+# HTTP goes to Django, /ws/live/<quiz ref>/ WebSockets to the live sessions
+application = LiveQuizApplication(django_application)
@@ -93,6 +93,19 @@ DATABASES = {
     }
 }
 
+# Shared between workers and management commands. Only holds data that can
+# be rebuilt: cached responses, snapshots and version stamps
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        }
+    }
+}
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -124,6 +137,9 @@ LOGIN_REDIRECT_URL = 'profile'
 STATIC_URL = 'static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 
+# Attempts older than this are rolled up by `manage.py rollup_attempts`
+ATTEMPT_RETENTION_DAYS = 365
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR / 'media')
 
@@ -4,6 +4,7 @@ from django.urls import path, include
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/v1/', include('test_app.api_urls')),
     path('', include('test_app.urls')),
     path('accounts/', include('accounts.urls')),
 ]
@@ -12,4 +12,8 @@ class UserRegistrationForm(UserCreationForm):
         def __init__(self, *args, **kwargs):
             super().__init__(*args, **kwargs)
             self.fields['password1'].widget.attrs.update({'class': 'form-register-input'})
-            self.fields['password2'].widget.attrs.update({'class': 'form-register-input'})
\ No newline at end of file
+            self.fields['password2'].widget.attrs.update({'class': 'form-register-input'})
+
+class RosterUploadForm(forms.Form):
+    roster = forms.FileField(help_text='CSV file with a username column and optional password and email columns.')
+    online = forms.BooleanField(required=False, label='Also create the accounts online')
@@ -0,0 +1,33 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.provisioning import parse_roster, provision_users
+
+
+class Command(BaseCommand):
+    help = 'Create student accounts from a CSV roster (username, optional password and email columns).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('roster', help='Path to the CSV roster.')
+        parser.add_argument('--online', action='store_true', help='Also create the accounts in the online database.')
+        parser.add_argument('--workers', type=int, default=None, help='Processes used for password hashing.')
+        parser.add_argument('--output', help='Write created usernames and passwords to this CSV file.')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['roster'], 'rb') as roster:
+                rows, errors = parse_roster(roster.read())
+        except OSError as e:
+            raise CommandError(f'Cannot read roster: {e}')
+        for error in errors:
+            self.stderr.write(error)
+
+        created, skipped = provision_users(rows, online=options['online'], workers=options['workers'])
+
+        if options['output']:
+            with open(options['output'], 'w', newline='') as output:
+                writer = csv.DictWriter(output, fieldnames=['username', 'email', 'password'])
+                writer.writeheader()
+                writer.writerows(created)
+        self.stdout.write(f'Created {len(created)} accounts, skipped {len(skipped)} existing, {len(errors)} invalid rows')
@@ -0,0 +1,129 @@
+import csv
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.utils.crypto import get_random_string
+
+from .models import User
+
+BATCH_SIZE = 500
+GENERATED_PASSWORD_LENGTH = 10
+
+
+def _init_worker(settings_module):
+    # Needed when workers are spawned instead of forked
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    django.setup()
+
+
+def parse_roster(roster):
+    """
+    Read a CSV roster with a `username` column and optional `password`
+    and `email` columns. Students without a password get a generated one.
+    Passwords go through AUTH_PASSWORD_VALIDATORS like on the sign-up form.
+
+    Returns (rows, errors).
+    """
+    if isinstance(roster, bytes):
+        roster = roster.decode('utf-8-sig')
+    max_length = User._meta.get_field('username').max_length
+    rows, errors, seen = [], [], set()
+    for line, record in enumerate(csv.DictReader(io.StringIO(roster)), start=2):
+        username = (record.get('username') or '').strip()
+        try:
+            User.username_validator(username)
+        except ValidationError:
+            errors.append(f'Line {line}: invalid username "{username}"')
+            continue
+        if len(username) > max_length:
+            errors.append(f'Line {line}: username "{username}" is longer than {max_length} characters')
+            continue
+        if username in seen:
+            errors.append(f'Line {line}: duplicate username "{username}"')
+            continue
+        email = (record.get('email') or '').strip()
+        password = (record.get('password') or '').strip() or get_random_string(GENERATED_PASSWORD_LENGTH)
+        try:
+            validate_password(password, user=User(username=username, email=email))
+        except ValidationError as e:
+            errors.append(f'Line {line}: weak password for "{username}": {" ".join(e.messages)}')
+            continue
+        seen.add(username)
+        rows.append({'username': username, 'email': email, 'password': password})
+    return rows, errors
+
+
+def hash_passwords(passwords, workers=None):
+    """Hash passwords in parallel, one process per core by default."""
+    if len(passwords) < 2:
+        return [make_password(password) for password in passwords]
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(passwords) // (workers * 4))
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'a_server.settings'),),
+    ) as executor:
+        return list(executor.map(make_password, passwords, chunksize=chunksize))
+
+
+def _existing_usernames(db_alias, usernames):
+    existing = set()
+    for start in range(0, len(usernames), BATCH_SIZE):
+        existing.update(
+            User.objects.using(db_alias)
+            .filter(username__in=usernames[start:start + BATCH_SIZE])
+            .values_list('username', flat=True)
+        )
+    return existing
+
+
+def _stored_hashes(db_alias, usernames):
+    stored = {}
+    for start in range(0, len(usernames), BATCH_SIZE):
+        stored.update(
+            User.objects.using(db_alias)
+            .filter(username__in=usernames[start:start + BATCH_SIZE])
+            .values_list('username', 'password')
+        )
+    return stored
+
+
+def provision_users(rows, online=False, workers=None):
+    """
+    Create accounts for roster rows that do not exist yet.
+
+    Passwords are hashed once and the same hashes are written to the
+    online database when `online` is set, so students can sign in to
+    published quizzes under the same username. Accounts created by
+    someone else while the roster is processed are skipped as existing.
+    Returns (created_rows, skipped_usernames).
+    """
+    existing = _existing_usernames('default', [row['username'] for row in rows])
+    new_rows = [row for row in rows if row['username'] not in existing]
+    hashes = hash_passwords([row['password'] for row in new_rows], workers=workers)
+
+    users = [
+        User(username=row['username'], email=row['email'], password=password)
+        for row, password in zip(new_rows, hashes)
+    ]
+    User.objects.bulk_create(users, batch_size=BATCH_SIZE, ignore_conflicts=True)
+    # Hashes are salted, so a stored hash identifies the rows written above
+    stored = _stored_hashes('default', [user.username for user in users])
+    users = [user for user in users if stored.get(user.username) == user.password]
+    usernames = {user.username for user in users}
+    created = [row for row in new_rows if row['username'] in usernames]
+    existing.update(row['username'] for row in new_rows if row['username'] not in usernames)
+
+    if online:
+        User.objects.using('online').bulk_create(
+            [User(username=user.username, email=user.email, password=user.password) for user in users],
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+    return created, sorted(existing)
@@ -1,3 +1,79 @@
+from unittest import mock
+
+from django.contrib.auth.hashers import check_password
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
+from django.urls import reverse
+
+from .models import User
+from .provisioning import parse_roster, provision_users
+
+
+class ParseRosterTests(TestCase):
+    def test_valid_rows_and_generated_passwords(self):
+        rows, errors = parse_roster(b'\xef\xbb\xbfusername,password,email\nanna,Correct-Horse-7,a@school.test\nben,,\n')
+        self.assertEqual(errors, [])
+        self.assertEqual(rows[0], {'username': 'anna', 'email': 'a@school.test', 'password': 'Correct-Horse-7'})
+        self.assertEqual(rows[1]['username'], 'ben')
+        self.assertTrue(rows[1]['password'])
+
+    def test_rejects_invalid_rows(self):
+        long_name = 'a' * (User._meta.get_field('username').max_length + 1)
+        roster = f'username,password\nweak,1\nbad name,\nanna,\nanna,\n{long_name},\n'
+        rows, errors = parse_roster(roster)
+        self.assertEqual([row['username'] for row in rows], ['anna'])
+        self.assertEqual(len(errors), 4)
+        self.assertTrue(errors[0].startswith('Line 2: weak password for "weak"'))
+        self.assertIn('Line 3: invalid username', errors[1])
+        self.assertIn('Line 5: duplicate username', errors[2])
+        self.assertIn('Line 6:', errors[3])
+        self.assertIn('longer than', errors[3])
+
+
+class ProvisionUsersTests(TestCase):
+    databases = {'default', 'online'}
+
+    def setUp(self):
+        self.rows, _ = parse_roster('username,password\nanna,Correct-Horse-7\nben,Battery-Staple-9\n')
+
+    def test_creates_accounts_on_both_databases_with_the_same_hash(self):
+        User.objects.create_user('ben', password='Existing-Pass-1')
+
+        created, skipped = provision_users(self.rows, online=True, workers=1)
+
+        self.assertEqual([row['username'] for row in created], ['anna'])
+        self.assertEqual(skipped, ['ben'])
+        anna = User.objects.get(username='anna')
+        self.assertTrue(check_password('Correct-Horse-7', anna.password))
+        self.assertEqual(User.objects.using('online').get(username='anna').password, anna.password)
+        self.assertFalse(User.objects.using('online').filter(username='ben').exists())
+
+    def test_account_created_concurrently_is_skipped(self):
+        User.objects.create_user('ben', password='Existing-Pass-1')
+        # As if ben signed up between the existence check and the insert
+        with mock.patch('accounts.provisioning._existing_usernames', return_value=set()):
+            created, skipped = provision_users(self.rows, workers=1)
+
+        self.assertEqual([row['username'] for row in created], ['anna'])
+        self.assertEqual(skipped, ['ben'])
+        self.assertTrue(User.objects.get(username='ben').check_password('Existing-Pass-1'))
+
+
+class BulkProvisionViewTests(TestCase):
+    databases = {'default', 'online'}
+
+    def post_roster(self, content):
+        return self.client.post(reverse('provision_students'), {
+            'roster': SimpleUploadedFile('roster.csv', content, content_type='text/csv'),
+        })
+
+    def test_staff_only(self):
+        self.client.force_login(User.objects.create_user('student'))
+        self.assertEqual(self.post_roster(b'username\nanna\n').status_code, 403)
 
-# Create your tests here.
+    def test_reports_created_accounts_and_rejected_rows(self):
+        self.client.force_login(User.objects.create_user('teacher', is_staff=True))
+        response = self.post_roster(b'username,password\nanna,Correct-Horse-7\nweak,1\n')
+        self.assertContains(response, 'Created 1 accounts')
+        self.assertContains(response, 'weak password for &quot;weak&quot;')
+        self.assertFalse(User.objects.filter(username='weak').exists())
@@ -1,9 +1,10 @@
 from django.urls import path
 from django.contrib.auth import views as auth_views
-from .views import UserCreationView, logout_view
+from .views import UserCreationView, BulkProvisionView, logout_view
 
 urlpatterns = [
     path('login/', auth_views.LoginView.as_view(template_name='login.html'), name='login'),
     path('logout/', logout_view, name='logout'),
     path('register/', UserCreationView.as_view(), name='register'),
+    path('provision/', BulkProvisionView.as_view(), name='provision_students'),
 ]
\ No newline at end of file
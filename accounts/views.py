@@ -1,15 +1,36 @@
 from django.shortcuts import render, redirect
 from django.views.generic import CreateView
+from django.views.generic.edit import FormView
 from django.urls import reverse_lazy
 from django.contrib.auth import logout
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from .models import User
-from .forms import UserRegistrationForm
+from .forms import UserRegistrationForm, RosterUploadForm
+from .provisioning import parse_roster, provision_users
 
 class UserCreationView(CreateView):
     form_class = UserRegistrationForm
     template_name = 'register.html'
     success_url = reverse_lazy('login')
 
+class BulkProvisionView(LoginRequiredMixin, UserPassesTestMixin, FormView):
+    form_class = RosterUploadForm
+    template_name = 'provision_students.html'
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def form_valid(self, form):
+        try:
+            rows, errors = parse_roster(form.cleaned_data['roster'].read())
+        except UnicodeDecodeError:
+            form.add_error('roster', 'The roster must be a UTF-8 encoded CSV file.')
+            return self.form_invalid(form)
+        created, skipped = provision_users(rows, online=form.cleaned_data['online'])
+        return self.render_to_response(self.get_context_data(
+            form=form, created=created, skipped=skipped, errors=errors
+        ))
+
 def logout_view(request):
     logout(request)
     return redirect('main')
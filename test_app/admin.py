@@ -1,7 +1,187 @@
-from django.contrib import admin
-from .models import Category, User, Quiz, Question
+import hashlib
 
-# Register your models here.
-admin.site.register(Category)
-admin.site.register(Quiz)
-admin.site.register(Question)
\ No newline at end of file
+from django.contrib import admin, messages
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.forms.models import BaseInlineFormSet
+from django.utils.functional import cached_property
+
+from .deletion import delete_attempts, delete_quizzes, purge_attempts
+from .models import Category, Choice, Question, Quiz, TestAttempt
+from .publishing import publish_quiz
+
+ADMIN_COUNT_CACHE_TIMEOUT = 60
+ACTION_BATCH_SIZE = 100
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that avoids a full COUNT(*) on large tables.
+
+    Unfiltered changelists on PostgreSQL use the planner's row estimate
+    from pg_class. Everything else is counted once and cached for a minute.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            # reltuples is -1 (or 0) until the table has been analyzed
+            if row and row[0] > 0:
+                return row[0]
+
+        sql, params = queryset.query.get_compiler(using=queryset.db).as_sql()
+        digest = hashlib.md5(f'{queryset.db}:{sql}:{params}'.encode()).hexdigest()
+        key = f'admin_count:{digest}'
+        count = cache.get(key)
+        if count is None:
+            count = super().count
+            cache.set(key, count, timeout=ADMIN_COUNT_CACHE_TIMEOUT)
+        return count
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    # Skips the second, unfiltered COUNT(*) of every changelist
+    show_full_result_count = False
+    list_per_page = 50
+
+
+class PaginatedInlineFormSet(BaseInlineFormSet):
+    """Inline formset that shows one page of the related rows at a time."""
+    per_page = 20
+    page_number = 1
+
+    def get_queryset(self):
+        if not hasattr(self, '_page_objects'):
+            paginator = Paginator(super().get_queryset(), self.per_page)
+            self.page = paginator.get_page(self.page_number)
+            self._page_objects = list(self.page.object_list)
+        return self._page_objects
+
+
+class PaginatedInline(admin.TabularInline):
+    formset = PaginatedInlineFormSet
+    template = 'admin/paginated_tabular.html'
+    extra = 0
+    show_change_link = True
+
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        formset.page_param = f'{self.model._meta.model_name}_page'
+        formset.page_number = request.GET.get(formset.page_param, 1)
+        return formset
+
+
+class ChoiceInline(PaginatedInline):
+    model = Choice
+    fields = ['text', 'is_correct']
+
+
+class QuestionInline(PaginatedInline):
+    model = Question
+    fields = ['text']
+
+
+class CategoryAdmin(admin.ModelAdmin):
+    list_display = ['title']
+    search_fields = ['title']
+
+
+class QuizAdmin(ScalableAdmin):
+    list_display = ['title', 'user', 'category', 'public', 'attempts_count', 'date_created']
+    list_select_related = ['user', 'category']
+    list_filter = ['public']
+    search_fields = ['title']
+    raw_id_fields = ['user']
+    autocomplete_fields = ['category']
+    readonly_fields = ['attempts_count', 'popularity', 'online_pk', 'date_created', 'updated_at']
+    inlines = [QuestionInline]
+    actions = ['publish_selected', 'delete_selected_quizzes']
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        # The stock action loads every related row to build its summary
+        actions.pop('delete_selected', None)
+        return actions
+
+    @admin.action(description='Publish selected quizzes online')
+    def publish_selected(self, request, queryset):
+        published, failed = 0, 0
+        pks = list(queryset.filter(public=False).values_list('pk', flat=True))
+        for start in range(0, len(pks), ACTION_BATCH_SIZE):
+            batch = Quiz.objects.filter(pk__in=pks[start:start + ACTION_BATCH_SIZE]).select_related('user', 'category')
+            for quiz in batch:
+                try:
+                    publish_quiz(quiz)
+                    published += 1
+                except Exception as e:
+                    failed += 1
+                    self.message_user(request, f'{quiz.title}: {e}', messages.ERROR)
+        self.message_user(request, f'Published {published} quizzes, {failed} failed.')
+
+    @admin.action(description='Delete selected quizzes', permissions=['delete'])
+    def delete_selected_quizzes(self, request, queryset):
+        pks = list(queryset.values_list('pk', flat=True))
+        online_pks = list(queryset.filter(public=True, online_pk__isnull=False).values_list('online_pk', flat=True))
+        try:
+            for start in range(0, len(online_pks), ACTION_BATCH_SIZE):
+                delete_quizzes('online', online_pks[start:start + ACTION_BATCH_SIZE])
+        except Exception as e:
+            self.message_user(request, f'Online copies not deleted: {e}', messages.WARNING)
+        for start in range(0, len(pks), ACTION_BATCH_SIZE):
+            delete_quizzes(queryset.db, pks[start:start + ACTION_BATCH_SIZE])
+        self.message_user(request, f'Deleted {len(pks)} quizzes.')
+
+
+class QuestionAdmin(ScalableAdmin):
+    list_display = ['text', 'quiz']
+    list_select_related = ['quiz']
+    search_fields = ['text']
+    raw_id_fields = ['quiz']
+    inlines = [ChoiceInline]
+
+
+class ChoiceAdmin(ScalableAdmin):
+    list_display = ['text', 'question', 'is_correct']
+    list_select_related = ['question']
+    raw_id_fields = ['question']
+
+
+class TestAttemptAdmin(ScalableAdmin):
+    list_display = ['quiz', 'user', 'score', 'total_questions', 'date_taken']
+    list_select_related = ['quiz', 'user']
+    raw_id_fields = ['user', 'quiz', 'snapshot']
+    readonly_fields = ['date_taken']
+    actions = ['delete_selected_attempts', 'delete_attempts_of_selected_users']
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    @admin.action(description='Delete selected attempts', permissions=['delete'])
+    def delete_selected_attempts(self, request, queryset):
+        deleted = delete_attempts(queryset.db, queryset.values_list('pk', flat=True))
+        self.message_user(request, f'Deleted {deleted} attempts.')
+
+    @admin.action(description="Delete ALL attempts of the selected attempts' users", permissions=['delete'])
+    def delete_attempts_of_selected_users(self, request, queryset):
+        user_ids = set(queryset.values_list('user_id', flat=True))
+        deleted = sum(purge_attempts(queryset.db, user_id) for user_id in user_ids)
+        self.message_user(request, f'Deleted {deleted} attempts of {len(user_ids)} users.')
+
+
+admin.site.register(Category, CategoryAdmin)
+admin.site.register(Quiz, QuizAdmin)
+admin.site.register(Question, QuestionAdmin)
+admin.site.register(Choice, ChoiceAdmin)
+admin.site.register(TestAttempt, TestAttemptAdmin)
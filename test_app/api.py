@@ -0,0 +1,344 @@
+import base64
+import hashlib
+import json
+import re
+from datetime import datetime
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Count, Max, Q, Sum
+from django.http import Http404, HttpResponse, JsonResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_datetime
+from django.utils.http import quote_etag
+from django.views.generic import View
+
+from .models import Quiz, TestAttempt
+from .reference import get_categories_version
+from .routing import SOURCE_NAMES, ObjectRef, ObjectRefConverter, get_object_by_ref, make_ref
+from .snapshots import get_current_snapshot
+from .views import get_feed_db_alias, get_quiz_version
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+API_VERSION = 'v1'
+# Bump when the payload format changes so cached bodies and ETags are not reused
+PAYLOAD_FORMAT = 2
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+FEED_CACHE_TIMEOUT = 60
+DETAIL_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Counters updated without touching Quiz.updated_at, versioned separately
+COUNTER_FIELDS = ('attempts_count', 'popularity')
+# id fields are refs such as "online-12", bare pks collide between the databases
+QUIZ_FIELDS = {
+    'id': None,
+    'title': 'title',
+    'description': 'description',
+    'category': 'category__title',
+    'author': 'user__username',
+    'date_created': 'date_created',
+    'attempts_count': 'attempts_count',
+    'popularity': 'popularity',
+    'questions_count': 'questions_count',
+}
+ATTEMPT_FIELDS = {
+    'id': None,
+    'quiz': None,
+    'quiz_title': 'quiz__title',
+    'score': 'score',
+    'total_questions': 'total_questions',
+    'date_taken': 'date_taken',
+}
+
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_plain(item) for item in value]
+    return value
+
+
+def dumps(payload):
+    """Compact JSON bytes, using orjson when it is installed."""
+    payload = _plain(payload)
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+def encode_cursor(moment, db_alias, pk):
+    return base64.urlsafe_b64encode(f'{moment.isoformat()}|{make_ref(db_alias, pk)}'.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """(moment, ObjectRef) of the last item of the previous page."""
+    try:
+        moment, ref = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        moment = parse_datetime(moment)
+        if moment is None or not re.fullmatch(ObjectRefConverter.regex, ref):
+            raise ValueError
+        return moment, ObjectRefConverter().to_python(ref)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+
+def after_cursor(queryset, date_field, cursor):
+    """
+    Rows of queryset that come after the cursor in (date, source, pk)
+    descending order. Including the source keeps the order total when
+    attempts of both databases are merged into one page.
+    """
+    moment, ref = cursor
+    source, cursor_source = SOURCE_NAMES[queryset.db], SOURCE_NAMES[ref.db_alias]
+    same_moment = Q(**{date_field: moment})
+    if source == cursor_source:
+        same_moment &= Q(pk__lt=ref.pk)
+    elif source > cursor_source:
+        same_moment = Q(pk__in=[])
+    return queryset.filter(Q(**{f'{date_field}__lt': moment}) | same_moment)
+
+
+class APIError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class APIView(View):
+    """
+    Base class of the read-only JSON API.
+
+    Subclasses implement get_version() returning a token that changes
+    whenever the response would, and build_payload() returning the data.
+    Responses are cached under that token and validated with an ETag.
+    """
+    http_method_names = ['get', 'head', 'options']
+    allowed_fields = {}
+    default_fields = None
+    cache_timeout = FEED_CACHE_TIMEOUT
+
+    def get_fields(self):
+        requested = self.request.GET.get('fields')
+        if not requested:
+            return list(self.default_fields or self.allowed_fields)
+        fields = [field.strip() for field in requested.split(',') if field.strip()]
+        unknown = set(fields) - set(self.allowed_fields)
+        if unknown:
+            raise APIError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        return fields
+
+    def get_limit(self):
+        try:
+            limit = int(self.request.GET.get('limit', DEFAULT_PAGE_SIZE))
+        except ValueError:
+            raise APIError('limit must be an integer')
+        return max(1, min(limit, MAX_PAGE_SIZE))
+
+    def get_cursor(self):
+        cursor = self.request.GET.get('cursor')
+        if not cursor:
+            return None
+        try:
+            return decode_cursor(cursor)
+        except ValueError as e:
+            raise APIError(str(e))
+
+    def get_version(self):
+        raise NotImplementedError
+
+    def build_payload(self):
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        try:
+            version = self.get_version()
+            raw = f'{PAYLOAD_FORMAT}:{self.__class__.__name__}:{version}:{request.get_full_path()}'
+            digest = hashlib.md5(raw.encode()).hexdigest()
+            key = f'api:{API_VERSION}:{digest}'
+            etag = quote_etag(digest)
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                body = cache.get(key)
+                if body is None:
+                    body = dumps(self.build_payload())
+                    cache.set(key, body, timeout=self.cache_timeout)
+                response = HttpResponse(body, content_type='application/json')
+        except APIError as e:
+            return JsonResponse({'error': str(e)}, status=e.status)
+
+        response.headers.setdefault('ETag', etag)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class QuizListAPIView(APIView):
+    """Public quiz feed, newest first, paginated with an opaque cursor."""
+    allowed_fields = {**QUIZ_FIELDS, 'url': None}
+    default_fields = ['id', 'title', 'category', 'author', 'date_created', 'url']
+
+    def get_queryset(self):
+        if not hasattr(self, '_queryset'):
+            queryset = Quiz.objects.using(get_feed_db_alias()).filter(public=True)
+            category = self.request.GET.get('category')
+            query = self.request.GET.get('q')
+            if category:
+                try:
+                    queryset = queryset.filter(category_id=int(category))
+                except ValueError:
+                    raise APIError('category must be an integer')
+            if query:
+                queryset = queryset.filter(Q(title__icontains=query) | Q(description__icontains=query))
+            self._queryset = queryset
+        return self._queryset
+
+    def get_version(self):
+        fields = self.get_fields()
+        counters = {field: Sum(field) for field in COUNTER_FIELDS if field in fields}
+        return get_quiz_version(self.get_queryset(), **counters)
+
+    def build_payload(self):
+        fields = self.get_fields()
+        limit = self.get_limit()
+        cursor = self.get_cursor()
+
+        queryset = self.get_queryset().order_by('-date_created', '-pk')
+        if 'questions_count' in fields:
+            queryset = queryset.annotate(questions_count=Count('questions'))
+        if cursor:
+            queryset = after_cursor(queryset, 'date_created', cursor)
+        columns = {QUIZ_FIELDS[field] for field in fields if QUIZ_FIELDS.get(field)}
+        rows = list(queryset.values('pk', 'date_created', *columns)[:limit + 1])
+
+        results = []
+        for row in rows[:limit]:
+            item = {}
+            for field in fields:
+                if field == 'id':
+                    item['id'] = make_ref(queryset.db, row['pk'])
+                elif field == 'url':
+                    item['url'] = reverse('quiz_detail', args=[ObjectRef(queryset.db, row['pk'])])
+                else:
+                    item[field] = row[QUIZ_FIELDS[field]]
+            results.append(item)
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = encode_cursor(last['date_created'], queryset.db, last['pk'])
+        return {'results': results, 'next_cursor': next_cursor}
+
+
+class QuizDetailAPIView(APIView):
+    """One public quiz with its questions and choices, correct answers excluded."""
+    allowed_fields = {**QUIZ_FIELDS, 'url': None, 'questions': None}
+    default_fields = ['id', 'title', 'description', 'category', 'author', 'date_created', 'url', 'questions']
+    cache_timeout = DETAIL_CACHE_TIMEOUT
+
+    def get_version(self):
+        db_alias, pk = self.kwargs['ref']
+        counters = [field for field in COUNTER_FIELDS if field in self.get_fields()]
+        try:
+            version = (
+                Quiz.objects.using(db_alias)
+                .filter(pk=pk, public=True)
+                .values_list('updated_at', *counters)
+                .first()
+            )
+        except Exception:
+            version = None
+        if version is None:
+            raise APIError('Quiz not found', status=404)
+        updated_at, *counts = version
+        return f'{db_alias}:{pk}:{updated_at.timestamp()}:{counts}:{get_categories_version(db_alias)}'
+
+    def build_payload(self):
+        fields = self.get_fields()
+        queryset = Quiz.objects.select_related('category', 'user').filter(public=True)
+        if 'questions_count' in fields:
+            queryset = queryset.annotate(questions_count=Count('questions'))
+        try:
+            quiz = get_object_by_ref(queryset, self.kwargs['ref'])
+        except Http404:
+            raise APIError('Quiz not found', status=404)
+
+        payload = {}
+        for field in fields:
+            if field == 'url':
+                payload['url'] = quiz.get_absolute_url()
+            elif field == 'questions':
+                content = get_current_snapshot(quiz).content
+                payload['questions'] = [
+                    {
+                        'id': question['id'],
+                        'text': question['text'],
+                        'choices': [{'id': c['id'], 'text': c['text']} for c in question['choices']],
+                    }
+                    for question in content['questions']
+                ]
+            elif field == 'id':
+                payload['id'] = make_ref(quiz._state.db, quiz.pk)
+            elif field == 'category':
+                payload['category'] = quiz.category.title
+            elif field == 'author':
+                payload['author'] = quiz.user.username
+            else:
+                payload[field] = getattr(quiz, field)
+        return payload
+
+
+class AttemptListAPIView(APIView):
+    """Attempts of the signed-in user on both databases, newest first."""
+    allowed_fields = ATTEMPT_FIELDS
+
+    def get_querysets(self):
+        if not self.request.user.is_authenticated:
+            raise APIError('Authentication required', status=401)
+        querysets = [TestAttempt.objects.filter(user=self.request.user)]
+        try:
+            online_user = User.objects.using('online').filter(username=self.request.user.username).first()
+            if online_user:
+                querysets.append(TestAttempt.objects.using('online').filter(user=online_user))
+        except Exception:
+            pass
+        return querysets
+
+    def get_version(self):
+        self.querysets = self.get_querysets()
+        token = []
+        for queryset in self.querysets:
+            version = queryset.order_by().aggregate(latest=Max('pk'), total=Count('pk'))
+            token.append(f"{queryset.db}:{version['latest']}:{version['total']}")
+        return f"{self.request.user.pk}:{','.join(token)}"
+
+    def build_payload(self):
+        fields = self.get_fields()
+        limit = self.get_limit()
+        cursor = self.get_cursor()
+        columns = {ATTEMPT_FIELDS[field] for field in fields if ATTEMPT_FIELDS[field]}
+
+        rows = []
+        for queryset in self.querysets:
+            queryset = queryset.order_by('-date_taken', '-pk')
+            if cursor:
+                queryset = after_cursor(queryset, 'date_taken', cursor)
+            for row in queryset.values('pk', 'date_taken', 'quiz_id', *columns)[:limit + 1]:
+                row['db_alias'] = queryset.db
+                row['id'] = make_ref(queryset.db, row['pk'])
+                row['quiz'] = make_ref(queryset.db, row['quiz_id'])
+                rows.append(row)
+        rows.sort(key=lambda row: (row['date_taken'], SOURCE_NAMES[row['db_alias']], row['pk']), reverse=True)
+
+        results = [{field: row[ATTEMPT_FIELDS[field] or field] for field in fields} for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = encode_cursor(last['date_taken'], last['db_alias'], last['pk'])
+        return {'results': results, 'next_cursor': next_cursor}
@@ -0,0 +1,11 @@
+from django.urls import path
+from . import routing  # noqa: F401 registers the <ref:...> converter
+from .api import QuizListAPIView, QuizDetailAPIView, AttemptListAPIView
+from .views import LegacyQuizRedirectView
+
+urlpatterns = [
+    path('quizzes/', QuizListAPIView.as_view(), name='api_quiz_list'),
+    path('quizzes/<ref:ref>/', QuizDetailAPIView.as_view(), name='api_quiz_detail'),
+    path('quizzes/<int:pk>/', LegacyQuizRedirectView.as_view(pattern_name='api_quiz_detail')),
+    path('attempts/', AttemptListAPIView.as_view(), name='api_attempt_list'),
+]
@@ -0,0 +1,104 @@
+from django.db import connections, transaction
+
+from .models import AttemptSummary, Choice, Question, Quiz, QuizScoreStats, QuizSnapshot, RelatedQuiz, TestAttempt
+from .scores import remove_scores
+
+BATCH_SIZE = 500
+
+
+def _in_clause(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def delete_quizzes(db_alias, quiz_ids):
+    """
+    Delete quizzes with everything that depends on them.
+
+    Unlike Model.delete() no rows are loaded: one set-based DELETE is
+    issued per table, children first, inside a single transaction.
+    Signals are not sent.
+    """
+    quiz_ids = list(quiz_ids)
+    if not quiz_ids:
+        return 0
+    placeholders = _in_clause(quiz_ids)
+    statements = [
+        (RelatedQuiz, f'quiz_id IN ({placeholders}) OR related_id IN ({placeholders})', quiz_ids * 2),
+        (TestAttempt, f'quiz_id IN ({placeholders})', quiz_ids),
+        (AttemptSummary, f'quiz_id IN ({placeholders})', quiz_ids),
+        (QuizSnapshot, f'quiz_id IN ({placeholders})', quiz_ids),
+        (QuizScoreStats, f'quiz_id IN ({placeholders})', quiz_ids),
+        (Choice, f'question_id IN (SELECT id FROM {Question._meta.db_table} WHERE quiz_id IN ({placeholders}))', quiz_ids),
+        (Question, f'quiz_id IN ({placeholders})', quiz_ids),
+        (Quiz, f'id IN ({placeholders})', quiz_ids),
+    ]
+    with transaction.atomic(using=db_alias), connections[db_alias].cursor() as cursor:
+        for model, where, params in statements:
+            cursor.execute(f'DELETE FROM {model._meta.db_table} WHERE {where}', params)
+        return cursor.rowcount
+
+
+def delete_published_copy(quiz):
+    """Delete the online copy recorded when the local quiz was published."""
+    if quiz.online_pk is None:
+        # Published before the copy's pk was recorded, it cannot be told apart safely
+        print(f"No recorded online copy for quiz {quiz.pk}, left in place")
+        return 0
+    return delete_quizzes('online', [quiz.online_pk])
+
+
+def _delete_attempt_batch(db_alias, pks):
+    """Delete attempts and take them out of the score stats in one transaction."""
+    with transaction.atomic(using=db_alias):
+        # Locked, so an attempt deleted twice concurrently is only subtracted once
+        scores = list(
+            TestAttempt.objects.using(db_alias).select_for_update()
+            .filter(pk__in=pks).values_list('quiz_id', 'score', 'total_questions')
+        )
+        with connections[db_alias].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TestAttempt._meta.db_table} WHERE id IN ({_in_clause(pks)})', pks)
+        remove_scores(db_alias, attempts=scores)
+    return len(scores)
+
+
+def delete_attempts(db_alias, pks, batch_size=BATCH_SIZE):
+    """Delete the given attempts in batches, keeping the score stats of their quizzes in step."""
+    pks = list(pks)
+    return sum(
+        _delete_attempt_batch(db_alias, pks[start:start + batch_size])
+        for start in range(0, len(pks), batch_size)
+    )
+
+
+def purge_attempts(db_alias, user_id, batch_size=BATCH_SIZE):
+    """
+    Delete all attempts of a user in batches, rolled up ones included.
+
+    Each batch runs in its own short transaction so the table is never
+    locked for the whole purge, and takes the deleted rows out of the
+    score stats of their quizzes in that same transaction.
+    """
+    summaries = AttemptSummary.objects.using(db_alias)
+    while True:
+        with transaction.atomic(using=db_alias):
+            batch = list(
+                summaries.select_for_update().filter(user_id=user_id).order_by()
+                .values_list('pk', 'quiz_id', 'score_histogram', 'percentage_sum')[:batch_size]
+            )
+            if not batch:
+                break
+            summaries.filter(pk__in=[row[0] for row in batch]).delete()
+            remove_scores(db_alias, summaries=[row[1:] for row in batch])
+
+    deleted = 0
+    while True:
+        batch = list(
+            TestAttempt.objects.using(db_alias)
+            .filter(user_id=user_id)
+            .order_by()
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not batch:
+            break
+        deleted += _delete_attempt_batch(db_alias, batch)
+    return deleted
@@ -1,12 +1,20 @@
 from django import forms
 from django.forms import inlineformset_factory
 from .models import Question, Quiz, Choice
+from .reference import get_categories
 
 class QuizForm(forms.ModelForm):
     class Meta:
         model = Quiz
         fields = ['title', 'category','description', 'public']
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Rendered from the category cache, the queryset is only used to validate
+        self.fields['category'].choices = [('', self.fields['category'].empty_label)] + [
+            (category.id, category.title) for category in get_categories()
+        ]
+
 class QuestionForm(forms.ModelForm):
     class Meta:
         model = Question
@@ -0,0 +1,409 @@
+"""
+Live classroom mode over WebSockets.
+
+The quiz owner connects as host and moves the class through the
+questions; every other signed-in user connects as a student. Sessions
+live in the memory of the worker process, so the ASGI server must run
+a single worker for live mode. Answers are tallied in memory and
+written to TestAttempt in batches when the session finishes: when the
+host presses Finish, when the host has been gone for HOST_GRACE_PERIOD
+seconds, or after SESSION_IDLE_TIMEOUT seconds without a host action.
+A session whose attempts cannot be saved stays open and is retried.
+"""
+import asyncio
+import json
+import re
+from collections import Counter
+from importlib import import_module
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.http import parse_cookie
+
+from .models import Quiz, TestAttempt
+from .popularity import record_attempt
+from .routing import ObjectRef, ObjectRefConverter, make_ref
+from .scores import record_scores
+from .snapshots import get_current_snapshot, grade
+
+LIVE_PATH = re.compile(rf'^/ws/live/(?P<ref>{ObjectRefConverter.regex})/$')
+# Messages queued for one socket before it is considered too slow and dropped
+SEND_QUEUE_SIZE = 64
+# Seconds between tally updates sent to the host
+TALLY_INTERVAL = 0.25
+ATTEMPT_BATCH_SIZE = 500
+# Seconds a session waits for a disconnected host before finishing on its own
+HOST_GRACE_PERIOD = 60
+# Seconds without a host action after which a session is finished
+SESSION_IDLE_TIMEOUT = 2 * 60 * 60
+# Seconds before saving the attempts of a session is tried again
+SAVE_RETRY_DELAY = 30
+
+# Close codes in the 4000-4999 range are reserved for applications
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_FORBIDDEN = 4403
+CLOSE_NOT_STARTED = 4404
+CLOSE_TOO_SLOW = 4408
+
+sessions = {}
+
+
+class Connection:
+    """One socket with its own send queue, so a slow client never blocks a broadcast."""
+
+    def __init__(self, send, user):
+        self.send = send
+        self.user = user
+        self.queue = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+        self.close_code = None
+
+    def push(self, text):
+        if self.close_code is not None:
+            return
+        try:
+            self.queue.put_nowait(text)
+        except asyncio.QueueFull:
+            self.close(CLOSE_TOO_SLOW)
+
+    def close(self, code=1000):
+        if self.close_code is None:
+            self.close_code = code
+            # The writer task closes the socket once it reaches the marker
+            while self.queue.full():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    async def writer(self):
+        while True:
+            text = await self.queue.get()
+            if text is None:
+                await self.send({'type': 'websocket.close', 'code': self.close_code})
+                return
+            await self.send({'type': 'websocket.send', 'text': text})
+
+
+class LiveSession:
+    def __init__(self, quiz, snapshot):
+        self.quiz = quiz
+        self.snapshot = snapshot
+        self.questions = snapshot.content['questions']
+        self.index = -1
+        self.host = None
+        self.students = {}
+        # Students who left before the end, their answers still count
+        self.departed_students = {}
+        self.answers = {}
+        self.tallies = [Counter() for _ in self.questions]
+        self.tally_pending = False
+        self.expiry = None
+        self.finishing = None
+        # Set while the attempts are written, answers are refused meanwhile
+        self.saving = False
+
+    @property
+    def ref(self):
+        return ObjectRef(self.quiz._state.db, self.quiz.pk)
+
+    @property
+    def current(self):
+        if 0 <= self.index < len(self.questions):
+            return self.questions[self.index]
+        return None
+
+    def question_message(self):
+        question = self.current
+        return {
+            'type': 'question',
+            'index': self.index,
+            'total': len(self.questions),
+            'question': {
+                'id': question['id'],
+                'text': question['text'],
+                'choices': [{'id': c['id'], 'text': c['text']} for c in question['choices']],
+            },
+        }
+
+    def broadcast(self, message):
+        # Serialized once, whatever the number of students
+        text = json.dumps(message, separators=(',', ':'))
+        for connection in self.students.values():
+            connection.push(text)
+
+    def send_host(self, message):
+        if self.host:
+            self.host.push(json.dumps(message, separators=(',', ':')))
+
+    def status_message(self):
+        message = {'type': 'status', 'index': self.index, 'total': len(self.questions), 'students': len(self.students)}
+        if self.current:
+            message['tally'] = dict(self.tallies[self.index])
+            message['answered'] = sum(self.tallies[self.index].values())
+        return message
+
+    def schedule_tally(self):
+        # Coalesce answer bursts into one host update per interval
+        if not self.tally_pending:
+            self.tally_pending = True
+            asyncio.get_running_loop().call_later(TALLY_INTERVAL, self.flush_tally)
+
+    def flush_tally(self):
+        self.tally_pending = False
+        self.send_host(self.status_message())
+
+    def schedule_expiry(self, delay, callback):
+        self.cancel_expiry()
+        self.expiry = asyncio.get_running_loop().call_later(delay, callback)
+
+    def cancel_expiry(self):
+        if self.expiry:
+            self.expiry.cancel()
+            self.expiry = None
+
+    def answer(self, user_id, question_id, choice_id):
+        question = self.current
+        if self.saving or not question or question['id'] != question_id:
+            return False
+        if choice_id not in {choice['id'] for choice in question['choices']}:
+            return False
+        answers = self.answers.setdefault(user_id, {})
+        previous = answers.get(question_id)
+        if previous is not None:
+            self.tallies[self.index][previous] -= 1
+        answers[question_id] = choice_id
+        self.tallies[self.index][choice_id] += 1
+        self.schedule_tally()
+        return True
+
+
+def get_scope_user(scope):
+    """The user of the Django session cookie sent with the handshake."""
+    headers = dict(scope.get('headers', []))
+    cookies = parse_cookie(headers.get(b'cookie', b'').decode('latin1'))
+    engine = import_module(settings.SESSION_ENGINE)
+    session = engine.SessionStore(cookies.get(settings.SESSION_COOKIE_NAME))
+    return auth.get_user(SimpleNamespace(session=session))
+
+
+def is_same_origin(scope):
+    headers = dict(scope.get('headers', []))
+    origin = headers.get(b'origin')
+    if origin is None:
+        return True
+    return urlsplit(origin.decode('latin1')).netloc == headers.get(b'host', b'').decode('latin1')
+
+
+def load_quiz(ref):
+    try:
+        quiz = Quiz.objects.using(ref.db_alias).select_related('user').filter(pk=ref.pk).first()
+    except Exception:
+        quiz = None
+    if not quiz:
+        return None, None
+    return quiz, get_current_snapshot(quiz)
+
+
+def persist_attempts(session):
+    """Grade every student and store their attempts in batches."""
+    quiz = session.quiz
+    db_alias = quiz._state.db
+    students = {**session.departed_students, **{pk: c.user for pk, c in session.students.items()}}
+    if not session.answers:
+        return {}
+
+    target_ids = {pk: pk for pk in session.answers}
+    if db_alias == 'online':
+        # Students sign in locally, their attempts belong to the online user of the same name
+        local = {pk: students[pk] for pk in session.answers}
+        online = dict(
+            User.objects.using('online')
+            .filter(username__in=[user.username for user in local.values()])
+            .values_list('username', 'pk')
+        )
+        missing = [
+            User(username=user.username, email=user.email, password=user.password)
+            for user in local.values() if user.username not in online
+        ]
+        User.objects.using('online').bulk_create(missing, batch_size=ATTEMPT_BATCH_SIZE)
+        online.update(
+            User.objects.using('online')
+            .filter(username__in=[user.username for user in missing])
+            .values_list('username', 'pk')
+        )
+        target_ids = {pk: online[user.username] for pk, user in local.items()}
+
+    total = len(session.questions)
+    scores, attempts = {}, []
+    for user_id, answers in session.answers.items():
+        score, _ = grade(session.snapshot.content, answers)
+        scores[user_id] = score
+        attempts.append(TestAttempt(
+            user_id=target_ids[user_id],
+            quiz_id=quiz.pk,
+            score=score,
+            total_questions=total,
+            snapshot_id=session.snapshot.pk,
+        ))
+    with transaction.atomic(using=db_alias):
+        TestAttempt.objects.using(db_alias).bulk_create(attempts, batch_size=ATTEMPT_BATCH_SIZE)
+        record_attempt(quiz, count=len(attempts))
+        record_scores(quiz, attempts)
+    return scores
+
+
+class LiveQuizApplication:
+    """
+    ASGI application serving live sessions on /ws/live/<quiz ref>/ and
+    passing everything else to Django.
+    """
+
+    def __init__(self, django_application):
+        self.django_application = django_application
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'websocket':
+            match = LIVE_PATH.match(scope['path'])
+            if match is None:
+                await receive()
+                await send({'type': 'websocket.close'})
+                return
+            await self.websocket(scope, receive, send, ObjectRefConverter().to_python(match['ref']))
+            return
+        await self.django_application(scope, receive, send)
+
+    async def websocket(self, scope, receive, send, ref):
+        message = await receive()
+        if message['type'] != 'websocket.connect':
+            return
+
+        user = scope.get('user') or await sync_to_async(get_scope_user)(scope)
+        if not user.is_authenticated:
+            await send({'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED})
+            return
+        if not is_same_origin(scope):
+            await send({'type': 'websocket.close', 'code': CLOSE_FORBIDDEN})
+            return
+
+        session = sessions.get(ref)
+        if session is None:
+            quiz, snapshot = await sync_to_async(load_quiz)(ref)
+            if quiz is None or quiz.user.username != user.username or not snapshot.content['questions']:
+                await send({'type': 'websocket.close', 'code': CLOSE_NOT_STARTED})
+                return
+            # Another host may have started it while the quiz was loading
+            session = sessions.setdefault(ref, LiveSession(quiz, snapshot))
+        is_host = session.quiz.user.username == user.username
+
+        await send({'type': 'websocket.accept'})
+        connection = Connection(send, user)
+        writer = asyncio.create_task(connection.writer())
+        if is_host:
+            if session.host:
+                session.host.close()
+            session.host = connection
+            self.schedule_expiry(session, SESSION_IDLE_TIMEOUT)
+            if session.current:
+                connection.push(json.dumps(session.question_message(), separators=(',', ':')))
+        else:
+            previous = session.students.pop(user.pk, None)
+            if previous:
+                previous.close()
+            session.students[user.pk] = connection
+            if session.current:
+                connection.push(json.dumps(session.question_message(), separators=(',', ':')))
+        session.schedule_tally()
+
+        disconnected = False
+        try:
+            while connection.close_code is None:
+                message = await receive()
+                if message['type'] == 'websocket.disconnect':
+                    disconnected = True
+                    break
+                if message['type'] != 'websocket.receive':
+                    continue
+                try:
+                    data = json.loads(message.get('text') or message.get('bytes') or '')
+                except ValueError:
+                    continue
+                if is_host:
+                    await self.host_action(session, data)
+                else:
+                    self.student_action(session, user, data)
+        finally:
+            if is_host and session.host is connection:
+                session.host = None
+                if sessions.get(session.ref) is session:
+                    self.schedule_expiry(session, HOST_GRACE_PERIOD)
+            elif not is_host and session.students.get(user.pk) is connection:
+                session.departed_students[user.pk] = session.students.pop(user.pk).user
+                session.schedule_tally()
+            if disconnected:
+                # The client is gone, queued messages can no longer be sent
+                connection.close_code = connection.close_code or 1000
+                writer.cancel()
+            else:
+                connection.close()
+                await writer
+
+    def schedule_expiry(self, session, delay):
+        def expire():
+            session.finishing = asyncio.create_task(self.finish(session))
+        session.schedule_expiry(delay, expire)
+
+    async def host_action(self, session, data):
+        action = data.get('action')
+        self.schedule_expiry(session, SESSION_IDLE_TIMEOUT)
+        if action == 'next' and session.index + 1 < len(session.questions):
+            session.index += 1
+            message = session.question_message()
+            session.broadcast(message)
+            session.send_host(message)
+            session.send_host(session.status_message())
+        elif action == 'finish':
+            await self.finish(session)
+
+    async def finish(self, session):
+        """
+        Save the attempts, send every student their score and close the session.
+
+        The session is only removed once its attempts are saved. If saving
+        fails it stays open, keeping every answer, and is tried again after
+        SAVE_RETRY_DELAY seconds or when the host presses Finish.
+        """
+        if sessions.get(session.ref) is not session or session.saving:
+            return
+        session.cancel_expiry()
+        session.saving = True
+        try:
+            scores = await sync_to_async(persist_attempts)(session)
+        except Exception as e:
+            print(f"Live session {make_ref(*session.ref)} not saved, retrying: {e}")
+            session.saving = False
+            session.send_host({'type': 'error', 'message': 'Results could not be saved yet, retrying'})
+            self.schedule_expiry(session, SAVE_RETRY_DELAY)
+            return
+        sessions.pop(session.ref)
+        total = len(session.questions)
+        for user_id, connection in session.students.items():
+            connection.push(json.dumps(
+                {'type': 'results', 'score': scores.get(user_id, 0), 'total': total},
+                separators=(',', ':'),
+            ))
+            connection.close()
+        session.send_host({'type': 'finished', 'students': len(scores), 'total': total})
+        if session.host:
+            session.host.close()
+
+    def student_action(self, session, user, data):
+        if data.get('action') != 'answer':
+            return
+        try:
+            question_id, choice_id = int(data['question']), int(data['choice'])
+        except (KeyError, TypeError, ValueError):
+            return
+        session.answer(user.pk, question_id, choice_id)
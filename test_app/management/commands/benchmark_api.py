@@ -0,0 +1,96 @@
+import math
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+
+from test_app.api import MAX_PAGE_SIZE
+from test_app.models import Quiz
+from test_app.routing import ObjectRef
+from test_app.views import get_feed_db_alias
+
+
+def percentile(values, fraction):
+    # Nearest-rank percentile of sorted values
+    return values[max(0, math.ceil(len(values) * fraction) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare payload size and latency of the JSON API against the HTML pages. '
+        'Both read the feed database, and the API feed is walked page by page '
+        'until it covers the same quizzes as the unpaginated HTML feed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Requests per endpoint.')
+        parser.add_argument(
+            '--quiz', type=int,
+            help='Quiz in the feed database used for the detail pages. Defaults to its newest public quiz.',
+        )
+
+    def get(self, client, url, headers=None):
+        response = client.get(url, headers=headers or {})
+        return response.status_code, len(response.content)
+
+    def get_all_pages(self, client, url):
+        # Follows next_cursor so the API returns the whole feed, like the HTML page
+        status, size, cursor = None, 0, ''
+        while cursor is not None:
+            params = {'limit': MAX_PAGE_SIZE}
+            if cursor:
+                params['cursor'] = cursor
+            response = client.get(url, params)
+            status = response.status_code
+            size += len(response.content)
+            cursor = response.json().get('next_cursor') if status == 200 else None
+        return status, size
+
+    def measure(self, fetch):
+        sizes, timings = [], []
+        for _ in range(self.requests):
+            start = time.perf_counter()
+            status, size = fetch()
+            timings.append(time.perf_counter() - start)
+            sizes.append(size)
+        timings.sort()
+        return {
+            'status': status,
+            'bytes': sum(sizes) // len(sizes),
+            'mean_ms': sum(timings) / len(timings) * 1000,
+            'p95_ms': percentile(timings, 0.95) * 1000,
+        }
+
+    def report(self, name, kind, result):
+        self.stdout.write(
+            f"{name:<8}{kind:<12}{result['status']:>7}{result['bytes']:>10}"
+            f"{result['mean_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+        )
+
+    def handle(self, *args, **options):
+        self.requests = max(1, options['requests'])
+        db_alias = get_feed_db_alias()
+        quiz_id = options['quiz'] or (
+            Quiz.objects.using(db_alias).filter(public=True)
+            .order_by('-date_created').values_list('pk', flat=True).first()
+        )
+        if quiz_id is None:
+            raise CommandError(f'No public quiz in the {db_alias} database to benchmark, pass --quiz.')
+
+        client = Client(HTTP_HOST='localhost')
+        ref = ObjectRef(db_alias, quiz_id)
+        feed_url, feed_api_url = reverse('main'), reverse('api_quiz_list')
+        detail_url, detail_api_url = reverse('quiz_detail', args=[ref]), reverse('api_quiz_detail', args=[ref])
+
+        self.stdout.write(f'feed database: {db_alias}')
+        self.stdout.write(f"{'page':<8}{'kind':<12}{'status':>7}{'bytes':>10}{'mean ms':>10}{'p95 ms':>10}")
+        self.report('feed', 'html', self.measure(lambda: self.get(client, feed_url)))
+        self.report('feed', 'api', self.measure(lambda: self.get_all_pages(client, feed_api_url)))
+        self.report('detail', 'html', self.measure(lambda: self.get(client, detail_url)))
+        self.report('detail', 'api', self.measure(lambda: self.get(client, detail_api_url)))
+        # A client that already holds the page only revalidates it
+        etag = client.get(detail_api_url).headers.get('ETag')
+        self.report('detail', 'api (304)', self.measure(
+            lambda: self.get(client, detail_api_url, headers={'If-None-Match': etag})
+        ))
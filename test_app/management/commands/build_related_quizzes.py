@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError
+
+from test_app.recommendations import RELATED_QUIZZES_LIMIT, build_related_quizzes
+
+
+class Command(BaseCommand):
+    help = 'Precompute "related quizzes" for every quiz from co-attempt data. Run periodically (e.g. nightly).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', action='append', dest='databases',
+            help='Database alias to rebuild, can be repeated. Defaults to default and online.',
+        )
+        parser.add_argument('--limit', type=int, default=RELATED_QUIZZES_LIMIT, help='Neighbours stored per quiz.')
+
+    def handle(self, *args, **options):
+        for db_alias in options['databases'] or ['default', 'online']:
+            try:
+                stored = build_related_quizzes(db_alias, limit=options['limit'])
+            except DatabaseError as e:
+                self.stderr.write(f'{db_alias}: skipped, database not available ({e})')
+                continue
+            self.stdout.write(f'{db_alias}: stored {stored} related quizzes')
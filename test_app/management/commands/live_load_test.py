@@ -0,0 +1,137 @@
+import asyncio
+import json
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from test_app.deletion import delete_quizzes
+from test_app.models import Category, Choice, Question, Quiz
+from test_app.routing import make_ref
+
+
+class FakeSocket:
+    """Both ends of an in-process WebSocket, driven through the ASGI interface."""
+
+    def __init__(self):
+        self.incoming = asyncio.Queue()
+        self.outgoing = asyncio.Queue()
+
+    async def receive(self):
+        return await self.incoming.get()
+
+    async def send(self, message):
+        await self.outgoing.put((time.perf_counter(), message))
+
+    async def expect(self, kind):
+        while True:
+            received_at, message = await self.outgoing.get()
+            if message['type'] == kind:
+                return received_at, message
+
+    def say(self, text):
+        self.incoming.put_nowait({'type': 'websocket.receive', 'text': text})
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Simulate a live session with many concurrent sockets on one worker, in process. '
+        'Runs on a throwaway quiz that is deleted afterwards with its attempts and stats.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=500)
+        parser.add_argument('--questions', type=int, default=10)
+        parser.add_argument('--choices', type=int, default=4)
+        parser.add_argument('--keep', action='store_true', help='Keep the generated quiz, students and attempts.')
+
+    def create_quiz(self, host, total_questions, total_choices):
+        category = Category.objects.order_by('pk').first()
+        if category is None:
+            raise CommandError('Create a category first.')
+        quiz = Quiz.objects.create(title='Live load test', user=host, category=category)
+        questions = Question.objects.bulk_create(
+            [Question(quiz=quiz, text=f'Question {i + 1}') for i in range(total_questions)]
+        )
+        Choice.objects.bulk_create([
+            Choice(question=question, text=f'Choice {j + 1}', is_correct=j == 0)
+            for question in questions for j in range(total_choices)
+        ])
+        return quiz
+
+    def handle(self, *args, **options):
+        usernames = [f'live_load_{i}' for i in range(options['students'])] + ['live_load_host']
+        existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        unusable = make_password(None)
+        User.objects.bulk_create(
+            [User(username=name, password=unusable) for name in usernames if name not in existing],
+            batch_size=500,
+        )
+        users = list(User.objects.filter(username__in=usernames))
+        host = next(user for user in users if user.username == 'live_load_host')
+        students = [user for user in users if user is not host]
+
+        total_questions = max(1, options['questions'])
+        quiz = None
+        try:
+            quiz = self.create_quiz(host, total_questions, max(2, options['choices']))
+            asyncio.run(self.simulate(quiz, students, total_questions))
+        finally:
+            if not options['keep']:
+                if quiz is not None:
+                    # Takes the attempts, snapshots and score stats with it
+                    delete_quizzes('default', [quiz.pk])
+                User.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+    async def simulate(self, quiz, students, total_questions):
+        from a_server.asgi import application
+
+        def connect(user):
+            socket = FakeSocket()
+            scope = {'type': 'websocket', 'path': f"/ws/live/{make_ref('default', quiz.pk)}/", 'headers': [], 'user': user}
+            socket.incoming.put_nowait({'type': 'websocket.connect'})
+            socket.task = asyncio.create_task(application(scope, socket.receive, socket.send))
+            return socket
+
+        host = connect(quiz.user)
+        await host.expect('websocket.accept')
+        start = time.perf_counter()
+        sockets = [connect(student) for student in students]
+        for socket in sockets:
+            await socket.expect('websocket.accept')
+        self.stdout.write(f'{len(sockets)} students connected in {(time.perf_counter() - start) * 1000:.1f} ms')
+
+        for _ in range(total_questions):
+            sent_at = time.perf_counter()
+            host.say('{"action": "next"}')
+            latencies = []
+            for socket in sockets:
+                received_at, message = await socket.expect('websocket.send')
+                latencies.append((received_at - sent_at) * 1000)
+            self.stdout.write(
+                f'broadcast to {len(sockets)} sockets: p50 {percentile(latencies, 0.5):.2f} ms, '
+                f'p99 {percentile(latencies, 0.99):.2f} ms, max {max(latencies):.2f} ms'
+            )
+            question = json.loads(message['text'])['question']
+            for socket in sockets:
+                choice = random.choice(question['choices'])
+                socket.say(json.dumps({'action': 'answer', 'question': question['id'], 'choice': choice['id']}))
+
+        sent_at = time.perf_counter()
+        host.say('{"action": "finish"}')
+        while True:
+            received_at, message = await host.expect('websocket.send')
+            if '"type":"finished"' in message['text']:
+                break
+        self.stdout.write(f'graded and saved attempts in {(received_at - sent_at) * 1000:.1f} ms: {message["text"]}')
+
+        for socket in [host] + sockets:
+            socket.incoming.put_nowait({'type': 'websocket.disconnect', 'code': 1000})
+        await asyncio.gather(*(socket.task for socket in [host] + sockets))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError
+
+from test_app.scores import rebuild_score_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-quiz score distributions from all attempts, e.g. to backfill them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', action='append', dest='databases',
+            help='Database alias to rebuild, can be repeated. Defaults to default and online.',
+        )
+
+    def handle(self, *args, **options):
+        for db_alias in options['databases'] or ['default', 'online']:
+            try:
+                rebuilt = rebuild_score_stats(db_alias)
+            except DatabaseError as e:
+                self.stderr.write(f'{db_alias}: skipped, database not available ({e})')
+                continue
+            self.stdout.write(f'{db_alias}: rebuilt score statistics of {rebuilt} quizzes')
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError
+
+from test_app.retention import get_retention_days, roll_up_attempts
+
+
+class Command(BaseCommand):
+    help = 'Roll attempts older than the retention period into monthly summaries and delete them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', action='append', dest='databases',
+            help='Database alias to roll up, can be repeated. Defaults to default and online.',
+        )
+        parser.add_argument(
+            '--days', type=int, default=None,
+            help='Keep raw attempts of the last N days. Defaults to ATTEMPT_RETENTION_DAYS.',
+        )
+
+    def handle(self, *args, **options):
+        days = options['days'] if options['days'] is not None else get_retention_days()
+        for db_alias in options['databases'] or ['default', 'online']:
+            try:
+                rolled_up = roll_up_attempts(db_alias, days=days)
+            except DatabaseError as e:
+                self.stderr.write(f'{db_alias}: skipped, database not available ({e})')
+                continue
+            self.stdout.write(f'{db_alias}: rolled up {rolled_up} attempts older than {days} days')
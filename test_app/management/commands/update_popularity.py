@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError
+
+from test_app.popularity import recompute_attempt_counts, recompute_popularity
+
+
+class Command(BaseCommand):
+    help = 'Recompute quiz attempt counts and popularity. Run periodically (e.g. from cron).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', action='append', dest='databases',
+            help='Database alias to update, can be repeated. Defaults to default and online.',
+        )
+
+    def handle(self, *args, **options):
+        for db_alias in options['databases'] or ['default', 'online']:
+            try:
+                counted = recompute_attempt_counts(db_alias)
+                scored = recompute_popularity(db_alias)
+            except DatabaseError as e:
+                self.stderr.write(f'{db_alias}: skipped, database not available ({e})')
+                continue
+            self.stdout.write(f'{db_alias}: counted attempts of {counted} quizzes, scored {scored} quizzes')
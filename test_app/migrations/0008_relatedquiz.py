@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-19 13:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('test_app', '0007_quiz_popularity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedQuiz',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(default=0)),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related', to='test_app.quiz')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='test_app.quiz')),
+            ],
+            options={
+                'ordering': ['-score'],
+                'constraints': [models.UniqueConstraint(fields=('quiz', 'related'), name='unique_related_quiz')],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 6.0 on 2026-10-19 13:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('test_app', '0010_quizsnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizScoreStats',
+            fields=[
+                ('quiz', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='score_stats', serialize=False, to='test_app.quiz')),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('percentage_sum', models.BigIntegerField(default=0)),
+                ('score_histogram', models.JSONField(default=list)),
+                ('percentage_counts', models.JSONField(default=list)),
+            ],
+        ),
+    ]
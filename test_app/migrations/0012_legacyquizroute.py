@@ -0,0 +1,21 @@
+# Generated by Django 6.0 on 2026-10-19 13:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('test_app', '0011_quizscorestats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LegacyQuizRoute',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('legacy_pk', models.PositiveIntegerField(unique=True)),
+                ('db_alias', models.CharField(max_length=20)),
+            ],
+        ),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_attempts_count(apps, schema_editor):
+    Quiz = apps.get_model('test_app', 'Quiz')
+    TestAttempt = apps.get_model('test_app', 'TestAttempt')
+    AttemptSummary = apps.get_model('test_app', 'AttemptSummary')
+    db_alias = schema_editor.connection.alias
+    raw = (
+        TestAttempt.objects.using(db_alias).filter(quiz=OuterRef('pk')).order_by()
+        .values('quiz').annotate(total=Count('pk')).values('total')
+    )
+    rolled_up = (
+        AttemptSummary.objects.using(db_alias).filter(quiz=OuterRef('pk')).order_by()
+        .values('quiz').annotate(total=Sum('attempts')).values('total')
+    )
+    Quiz.objects.using(db_alias).update(
+        attempts_count=Coalesce(Subquery(raw), 0) + Coalesce(Subquery(rolled_up), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('test_app', '0012_legacyquizroute'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_attempts_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-19 13:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('test_app', '0013_backfill_attempts_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='online_pk',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,42 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+
+
+class ConditionalGetMixin:
+    """
+    Answers GET with 304 Not Modified when the page has not changed.
+
+    Subclasses implement get_content_version() and return a token
+    computed with a single cheap query. Pages are validated by ETag only:
+    a Last-Modified date taken from updated_at would not move when a
+    quiz is deleted or a category renamed.
+    """
+    public_max_age = 60
+
+    def get_content_version(self):
+        return None
+
+    def get_etag(self, token):
+        user = self.request.user
+        owner = user.pk if user.is_authenticated else 'anon'
+        raw = f'{self.__class__.__name__}:{token}:{owner}'
+        return quote_etag(hashlib.md5(raw.encode()).hexdigest())
+
+    def get(self, request, *args, **kwargs):
+        token = self.get_content_version()
+        if token is None:
+            return super().get(request, *args, **kwargs)
+
+        etag = self.get_etag(token)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+
+        response.headers.setdefault('ETag', etag)
+        if request.user.is_authenticated:
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            patch_cache_control(response, public=True, max_age=self.public_max_age)
+        return response
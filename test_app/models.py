@@ -1,3 +1,5 @@
+import math
+
 from django.db import models
 from django.contrib.auth.models import User
 from django.urls import reverse
@@ -14,10 +16,20 @@ class Quiz(models.Model):
     description = models.TextField(null=True, blank=True)
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
     date_created = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     public = models.BooleanField(default=False)
+    attempts_count = models.PositiveIntegerField(default=0)
+    popularity = models.FloatField(default=0)
+    # pk of the copy publish_quiz() created in the online database
+    online_pk = models.PositiveIntegerField(null=True, blank=True)
 
     def get_absolute_url(self):
-        return reverse('quiz_detail', args=[str(self.id)])
+        return reverse('quiz_detail', args=[self])
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-popularity', '-date_created'], name='quiz_popularity_idx'),
+        ]
 
 class Question(models.Model):
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='questions')
@@ -28,12 +40,31 @@ class Choice(models.Model):
     text = models.CharField('Variant of answer', max_length=100)
     is_correct = models.BooleanField('Is this the correct variant?', default=False)
 
+class QuizSnapshot(models.Model):
+    """Immutable content of one version of a quiz, shared by all attempts on it."""
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='snapshots')
+    content_hash = models.CharField(max_length=64, unique=True)
+    content = models.JSONField()
+    date_created = models.DateTimeField(auto_now_add=True)
+
+
+HISTOGRAM_BINS = 10
+
+
+def score_bin(score, total_questions):
+    """Index of the fixed-width histogram bin for score/total_questions."""
+    if total_questions <= 0:
+        return 0
+    return min(int(score / total_questions * HISTOGRAM_BINS), HISTOGRAM_BINS - 1)
+
+
 class TestAttempt(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='attempts')
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='attempts')
     score = models.IntegerField(default=0)
     total_questions = models.IntegerField(default=0)
     date_taken = models.DateTimeField(auto_now_add=True)
+    snapshot = models.ForeignKey(QuizSnapshot, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
 
     def get_percentage(self):
         if self.total_questions == 0:
@@ -41,4 +72,77 @@ class TestAttempt(models.Model):
         return round((self.score / self.total_questions) * 100)
 
     class Meta:
-        ordering = ['-date_taken']
\ No newline at end of file
+        ordering = ['-date_taken']
+
+class AttemptSummary(models.Model):
+    """Attempts of one user on one quiz in one month, rolled up from TestAttempt."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='attempt_summaries')
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='attempt_summaries')
+    month = models.DateField()
+    attempts = models.PositiveIntegerField(default=0)
+    best_percentage = models.IntegerField(default=0)
+    percentage_sum = models.IntegerField(default=0)
+    score_histogram = models.JSONField(default=list)
+
+    def get_mean_percentage(self):
+        if self.attempts == 0:
+            return 0
+        return round(self.percentage_sum / self.attempts)
+
+    class Meta:
+        ordering = ['-month']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'quiz', 'month'], name='unique_attempt_summary'),
+        ]
+
+
+class QuizScoreStats(models.Model):
+    """
+    Score distribution of a quiz, updated with every submitted attempt.
+
+    percentage_counts holds how many attempts scored each whole
+    percentage from 0 to 100, which makes any percentile exact to the
+    percent without reading the attempts.
+    """
+    quiz = models.OneToOneField(Quiz, on_delete=models.CASCADE, primary_key=True, related_name='score_stats')
+    attempts = models.PositiveIntegerField(default=0)
+    percentage_sum = models.BigIntegerField(default=0)
+    score_histogram = models.JSONField(default=list)
+    percentage_counts = models.JSONField(default=list)
+
+    def get_mean_percentage(self):
+        if self.attempts == 0:
+            return 0
+        return round(self.percentage_sum / self.attempts)
+
+    def get_percentile(self, fraction):
+        if self.attempts == 0:
+            return 0
+        rank = max(1, math.ceil(fraction * self.attempts))
+        seen = 0
+        for percentage, count in enumerate(self.percentage_counts):
+            seen += count
+            if seen >= rank:
+                return percentage
+        return 100
+
+    def get_median(self):
+        return self.get_percentile(0.5)
+
+
+class RelatedQuiz(models.Model):
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='related')
+    related = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField(default=0)
+
+    class Meta:
+        ordering = ['-score']
+        constraints = [
+            models.UniqueConstraint(fields=['quiz', 'related'], name='unique_related_quiz'),
+        ]
+
+
+class LegacyQuizRoute(models.Model):
+    """Database an old integer-only quiz URL resolved to, kept so it keeps resolving the same way."""
+    legacy_pk = models.PositiveIntegerField(unique=True)
+    db_alias = models.CharField(max_length=20)
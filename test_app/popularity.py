@@ -0,0 +1,71 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import AttemptSummary, Quiz, TestAttempt
+
+# Days after which an attempt counts half as much towards popularity
+POPULARITY_HALF_LIFE_DAYS = 7
+# Attempts older than this many half-lives contribute almost nothing
+POPULARITY_WINDOW_HALF_LIVES = 8
+BATCH_SIZE = 500
+
+
+def record_attempt(quiz, count=1):
+    """Add submitted attempts to Quiz.attempts_count with one atomic UPDATE."""
+    Quiz.objects.using(quiz._state.db).filter(pk=quiz.pk).update(
+        attempts_count=F('attempts_count') + count
+    )
+
+
+def recompute_attempt_counts(db_alias):
+    """
+    Set Quiz.attempts_count from TestAttempt and the rolled up AttemptSummary
+    rows in a single UPDATE, correcting any drift.
+    """
+    raw = (
+        TestAttempt.objects.using(db_alias).filter(quiz=OuterRef('pk')).order_by()
+        .values('quiz').annotate(total=Count('pk')).values('total')
+    )
+    rolled_up = (
+        AttemptSummary.objects.using(db_alias).filter(quiz=OuterRef('pk')).order_by()
+        .values('quiz').annotate(total=Sum('attempts')).values('total')
+    )
+    return Quiz.objects.using(db_alias).update(
+        attempts_count=Coalesce(Subquery(raw), 0) + Coalesce(Subquery(rolled_up), 0)
+    )
+
+
+def recompute_popularity(db_alias, now=None):
+    """
+    Recompute the time-decayed Quiz.popularity score from recent attempts.
+
+    Attempts are grouped per quiz and day, so the query returns at most
+    one row per quiz for every day of the window.
+    """
+    now = now or timezone.now()
+    window = timedelta(days=POPULARITY_HALF_LIFE_DAYS * POPULARITY_WINDOW_HALF_LIVES)
+    today = now.date()
+
+    daily = (
+        TestAttempt.objects.using(db_alias)
+        .filter(date_taken__gte=now - window)
+        .annotate(day=TruncDate('date_taken'))
+        .values('quiz_id', 'day')
+        .annotate(taken=Count('id'))
+        .order_by()
+    )
+    scores = {}
+    for row in daily.iterator(chunk_size=BATCH_SIZE):
+        age = (today - row['day']).days
+        weight = 0.5 ** (age / POPULARITY_HALF_LIFE_DAYS)
+        scores[row['quiz_id']] = scores.get(row['quiz_id'], 0) + row['taken'] * weight
+
+    quizzes = [Quiz(pk=pk, popularity=round(score, 4)) for pk, score in scores.items()]
+    with transaction.atomic(using=db_alias):
+        Quiz.objects.using(db_alias).filter(popularity__gt=0).update(popularity=0)
+        Quiz.objects.using(db_alias).bulk_update(quizzes, ['popularity'], batch_size=BATCH_SIZE)
+    return len(quizzes)
@@ -0,0 +1,58 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .models import Category, Choice, Question, Quiz
+from .signals import touch_quiz
+
+BATCH_SIZE = 500
+
+
+def publish_quiz(quiz):
+    """
+    Copy a local quiz with its questions and choices to the online database
+    and mark it public.
+
+    Questions and choices are inserted with one bulk_create each instead of
+    one INSERT per row.
+    """
+    online_user, _ = User.objects.using('online').get_or_create(
+        username=quiz.user.username,
+        defaults={
+            'email': quiz.user.email,
+            'password': quiz.user.password
+        }
+    )
+    online_category, _ = Category.objects.using('online').get_or_create(
+        title=quiz.category.title,
+        defaults={'image': quiz.category.image}
+    )
+    questions = list(quiz.questions.prefetch_related('choices').order_by('pk'))
+
+    with transaction.atomic(using='online'):
+        online_quiz = Quiz.objects.using('online').create(
+            title=quiz.title,
+            user=online_user,
+            description=quiz.description,
+            category=online_category,
+            public=True,
+            date_created=quiz.date_created
+        )
+        online_questions = Question.objects.using('online').bulk_create(
+            [Question(quiz=online_quiz, text=q.text) for q in questions],
+            batch_size=BATCH_SIZE,
+        )
+        Choice.objects.using('online').bulk_create(
+            [
+                Choice(question=online_q, text=c.text, is_correct=c.is_correct)
+                for q, online_q in zip(questions, online_questions)
+                for c in q.choices.all()
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        # bulk_create sends no signals
+        touch_quiz('online', pk=online_quiz.pk)
+
+    quiz.public = True
+    quiz.online_pk = online_quiz.pk
+    quiz.save()
+    return online_quiz
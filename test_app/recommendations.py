@@ -0,0 +1,145 @@
+import heapq
+import math
+import time
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Quiz, RelatedQuiz, TestAttempt
+
+RELATED_QUIZZES_LIMIT = 5
+# Only the most recent quizzes of very active users are paired, which
+# keeps the per-user work bounded
+MAX_QUIZZES_PER_USER = 50
+# Co-occurrence counters held in memory at once while building
+MAX_PAIR_COUNTERS = 1_000_000
+BATCH_SIZE = 2000
+
+
+def related_version_key(db_alias):
+    return f'related_quizzes_version:{db_alias}'
+
+
+def get_related_version(db_alias):
+    key = related_version_key(db_alias)
+    version = cache.get(key)
+    if version is None:
+        # A fresh stamp, so a culled key never brings back an old ETag
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def iter_user_quizzes(db_alias, chunk_size=BATCH_SIZE):
+    """
+    Yield (user_id, quiz_ids) rows of the sparse user x quiz matrix.
+
+    Attempts are streamed in chunks ordered by user, so only one user's
+    row is held in memory at a time.
+    """
+    pairs = (
+        TestAttempt.objects.using(db_alias)
+        .order_by('user_id', '-date_taken')
+        .values_list('user_id', 'quiz_id')
+    )
+    current_user, quiz_ids = None, []
+    for user_id, quiz_id in pairs.iterator(chunk_size=chunk_size):
+        if user_id != current_user:
+            if quiz_ids:
+                yield current_user, quiz_ids
+            current_user, quiz_ids = user_id, []
+        if quiz_id not in quiz_ids and len(quiz_ids) < MAX_QUIZZES_PER_USER:
+            quiz_ids.append(quiz_id)
+    if quiz_ids:
+        yield current_user, quiz_ids
+
+
+def count_takers(db_alias, chunk_size=BATCH_SIZE):
+    takers = defaultdict(int)
+    for _, quiz_ids in iter_user_quizzes(db_alias, chunk_size):
+        for quiz_id in quiz_ids:
+            takers[quiz_id] += 1
+    return takers
+
+
+def iter_neighbours(db_alias, candidates, limit, chunk_size=BATCH_SIZE, max_counters=MAX_PAIR_COUNTERS):
+    """
+    Yield (quiz_id, [(score, other_quiz_id), ...]) with the `limit` candidate
+    quizzes most similar to each quiz, by item-item cosine similarity over
+    binary user x quiz rows.
+
+    Quizzes are processed in blocks small enough that at most max_counters
+    co-occurrence counters exist at a time, and each block is pruned to its
+    top neighbours before the next one starts. The attempts are streamed
+    once per block.
+    """
+    takers = count_takers(db_alias, chunk_size)
+    candidates = {pk for pk in candidates if pk in takers}
+    quiz_ids = sorted(takers)
+    block_size = max(1, max_counters // max(1, len(candidates)))
+    for start in range(0, len(quiz_ids), block_size):
+        block = set(quiz_ids[start:start + block_size])
+        co_taken = defaultdict(lambda: defaultdict(int))
+        for _, user_quiz_ids in iter_user_quizzes(db_alias, chunk_size):
+            own = [pk for pk in user_quiz_ids if pk in block]
+            if not own:
+                continue
+            others = [pk for pk in user_quiz_ids if pk in candidates]
+            for a in own:
+                counts = co_taken[a]
+                for b in others:
+                    if b != a:
+                        counts[b] += 1
+        for a, counts in co_taken.items():
+            yield a, heapq.nlargest(limit, (
+                (count / math.sqrt(takers[a] * takers[b]), b) for b, count in counts.items()
+            ))
+
+
+def build_related_quizzes(db_alias, limit=RELATED_QUIZZES_LIMIT, chunk_size=BATCH_SIZE):
+    """
+    Rebuild the RelatedQuiz table of a database.
+
+    Quizzes without enough co-attempts are topped up with the most popular
+    public quizzes of the same category.
+    """
+    quizzes = {
+        pk: (category_id, public)
+        for pk, category_id, public in Quiz.objects.using(db_alias)
+        .order_by('-popularity', '-date_created')
+        .values_list('pk', 'category_id', 'public')
+        .iterator(chunk_size=chunk_size)
+    }
+    by_category = defaultdict(list)
+    for pk, (category_id, public) in quizzes.items():
+        if public and len(by_category[category_id]) <= limit:
+            by_category[category_id].append(pk)
+
+    public = {pk for pk, (_, is_public) in quizzes.items() if is_public}
+    neighbours = {
+        pk: top for pk, top in iter_neighbours(db_alias, public, limit, chunk_size)
+        if pk in quizzes
+    }
+
+    rows = []
+    for pk, (category_id, _) in quizzes.items():
+        top = neighbours.get(pk, [])
+        chosen = {other for _, other in top}
+        for other in by_category[category_id]:
+            if len(top) >= limit:
+                break
+            if other != pk and other not in chosen:
+                # Fallback rows rank below any co-attempt based neighbour
+                top.append((0, other))
+                chosen.add(other)
+        rows.extend(
+            RelatedQuiz(quiz_id=pk, related_id=other, score=round(score, 6))
+            for score, other in top
+        )
+
+    with transaction.atomic(using=db_alias):
+        RelatedQuiz.objects.using(db_alias).all().delete()
+        RelatedQuiz.objects.using(db_alias).bulk_create(rows, batch_size=chunk_size)
+    cache.set(related_version_key(db_alias), time.time_ns(), timeout=None)
+    return len(rows)
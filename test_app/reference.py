@@ -0,0 +1,60 @@
+"""
+Process-local cache of reference data that almost never changes.
+
+Each worker keeps the categories of every database in memory together
+with the version they were loaded at. The version lives in the shared
+cache and is bumped when a Category is saved or deleted, so all workers
+reload on their next request.
+"""
+import time
+from collections import namedtuple
+
+from django.core.cache import cache
+
+from .models import Category
+
+CachedCategory = namedtuple('CachedCategory', ['id', 'title', 'image_url'])
+
+_categories = {}
+
+
+def _initial_version():
+    # Never reuse a version a worker may still hold after the cache is cleared
+    return time.time_ns()
+
+
+def categories_version_key(db_alias):
+    return f'categories_version:{db_alias}'
+
+
+def bump_categories_version(db_alias):
+    key = categories_version_key(db_alias)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _initial_version(), timeout=None)
+
+
+def get_categories_version(db_alias='default'):
+    """Opaque stamp that changes whenever a category of the database changes."""
+    key = categories_version_key(db_alias)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def get_categories(db_alias='default'):
+    """All categories of a database as CachedCategory tuples."""
+    version = get_categories_version(db_alias)
+    cached = _categories.get(db_alias)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    categories = [
+        CachedCategory(category.pk, category.title, category.image.url if category.image else '')
+        for category in Category.objects.using(db_alias).order_by('pk')
+    ]
+    _categories[db_alias] = (version, categories)
+    return categories
@@ -0,0 +1,85 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import HISTOGRAM_BINS, AttemptSummary, TestAttempt, score_bin
+
+BATCH_SIZE = 500
+
+
+def get_retention_days():
+    return getattr(settings, 'ATTEMPT_RETENTION_DAYS', 365)
+
+
+def _summarize(attempts):
+    summaries = {}
+    for attempt in attempts:
+        key = (attempt.user_id, attempt.quiz_id, attempt.date_taken.date().replace(day=1))
+        summary = summaries.setdefault(key, {
+            'attempts': 0,
+            'best_percentage': 0,
+            'percentage_sum': 0,
+            'score_histogram': [0] * HISTOGRAM_BINS,
+        })
+        percentage = attempt.get_percentage()
+        summary['attempts'] += 1
+        summary['best_percentage'] = max(summary['best_percentage'], percentage)
+        summary['percentage_sum'] += percentage
+        summary['score_histogram'][score_bin(attempt.score, attempt.total_questions)] += 1
+    return summaries
+
+
+def _merge_batch(db_alias, attempts):
+    summaries = _summarize(attempts)
+    existing = AttemptSummary.objects.using(db_alias).filter(
+        user_id__in={user_id for user_id, _, _ in summaries},
+        quiz_id__in={quiz_id for _, quiz_id, _ in summaries},
+        month__in={month for _, _, month in summaries},
+    )
+    to_update = []
+    for summary in existing:
+        rolled = summaries.pop((summary.user_id, summary.quiz_id, summary.month), None)
+        if rolled is None:
+            continue
+        histogram = summary.score_histogram or [0] * HISTOGRAM_BINS
+        summary.attempts += rolled['attempts']
+        summary.best_percentage = max(summary.best_percentage, rolled['best_percentage'])
+        summary.percentage_sum += rolled['percentage_sum']
+        summary.score_histogram = [a + b for a, b in zip(histogram, rolled['score_histogram'])]
+        to_update.append(summary)
+
+    AttemptSummary.objects.using(db_alias).bulk_update(
+        to_update, ['attempts', 'best_percentage', 'percentage_sum', 'score_histogram']
+    )
+    AttemptSummary.objects.using(db_alias).bulk_create([
+        AttemptSummary(user_id=user_id, quiz_id=quiz_id, month=month, **rolled)
+        for (user_id, quiz_id, month), rolled in summaries.items()
+    ])
+
+
+def roll_up_attempts(db_alias, days=None, batch_size=BATCH_SIZE):
+    """
+    Fold attempts older than `days` into AttemptSummary rows and delete them.
+
+    Every batch is merged and deleted in its own transaction, so an
+    interrupted run never counts an attempt twice and never holds a
+    long lock on TestAttempt.
+    """
+    days = get_retention_days() if days is None else days
+    cutoff = timezone.now() - timedelta(days=days)
+    rolled_up = 0
+    while True:
+        with transaction.atomic(using=db_alias):
+            attempts = list(
+                TestAttempt.objects.using(db_alias)
+                .filter(date_taken__lt=cutoff)
+                .order_by('pk')
+                .only('pk', 'user_id', 'quiz_id', 'score', 'total_questions', 'date_taken')[:batch_size]
+            )
+            if not attempts:
+                return rolled_up
+            _merge_batch(db_alias, attempts)
+            TestAttempt.objects.using(db_alias).filter(pk__in=[a.pk for a in attempts]).delete()
+        rolled_up += len(attempts)
@@ -0,0 +1,151 @@
+from collections import defaultdict
+
+from django.db import transaction
+
+from .models import HISTOGRAM_BINS, AttemptSummary, QuizScoreStats, TestAttempt, score_bin
+
+PERCENTAGE_BUCKETS = 101
+BATCH_SIZE = 2000
+
+
+def _percentage(score, total_questions):
+    if total_questions <= 0:
+        return 0
+    return min(100, round(score / total_questions * 100))
+
+
+def _empty_distribution():
+    return {
+        'attempts': 0,
+        'percentage_sum': 0,
+        'score_histogram': [0] * HISTOGRAM_BINS,
+        'percentage_counts': [0] * PERCENTAGE_BUCKETS,
+    }
+
+
+def _add(distribution, score, total_questions, count=1):
+    percentage = _percentage(score, total_questions)
+    distribution['attempts'] += count
+    distribution['percentage_sum'] += percentage * count
+    distribution['score_histogram'][score_bin(score, total_questions)] += count
+    distribution['percentage_counts'][percentage] += count
+
+
+def _add_summary(distribution, histogram, percentage_sum, sign=1):
+    # Rolled up attempts only keep a 10-bin histogram, each one is placed
+    # at the middle percentage of its bin. The sum stays exact.
+    bin_width = 100 / HISTOGRAM_BINS
+    approximate_sum = distribution['percentage_sum']
+    for index, count in enumerate(histogram or []):
+        if count:
+            _add(distribution, round((index + 0.5) * bin_width), 100, sign * count)
+    distribution['percentage_sum'] = approximate_sum + sign * percentage_sum
+
+
+def record_scores(quiz, attempts):
+    """Add submitted attempts of one quiz to its QuizScoreStats row."""
+    db_alias = quiz._state.db
+    with transaction.atomic(using=db_alias):
+        QuizScoreStats.objects.using(db_alias).get_or_create(quiz_id=quiz.pk)
+        stats = QuizScoreStats.objects.using(db_alias).select_for_update().get(quiz_id=quiz.pk)
+        distribution = {
+            'attempts': stats.attempts,
+            'percentage_sum': stats.percentage_sum,
+            'score_histogram': stats.score_histogram or [0] * HISTOGRAM_BINS,
+            'percentage_counts': stats.percentage_counts or [0] * PERCENTAGE_BUCKETS,
+        }
+        for attempt in attempts:
+            _add(distribution, attempt.score, attempt.total_questions)
+        for field, value in distribution.items():
+            setattr(stats, field, value)
+        stats.save(using=db_alias)
+    return stats
+
+
+def remove_scores(db_alias, attempts=(), summaries=()):
+    """
+    Take deleted attempts, as (quiz_id, score, total_questions), and
+    deleted summaries, as (quiz_id, score_histogram, percentage_sum), out
+    of the QuizScoreStats rows of their quizzes.
+
+    Call it in the transaction that deletes them. The rows are locked
+    like in record_scores, so no concurrent submission is lost.
+    """
+    changes = defaultdict(_empty_distribution)
+    for quiz_id, score, total_questions in attempts:
+        _add(changes[quiz_id], score, total_questions, -1)
+    for quiz_id, histogram, percentage_sum in summaries:
+        _add_summary(changes[quiz_id], histogram, percentage_sum, -1)
+    if not changes:
+        return 0
+
+    with transaction.atomic(using=db_alias):
+        rows = list(
+            QuizScoreStats.objects.using(db_alias).select_for_update()
+            .filter(quiz_id__in=changes).order_by('quiz_id')
+        )
+        for stats in rows:
+            change = changes[stats.quiz_id]
+            stats.attempts = max(0, stats.attempts + change['attempts'])
+            stats.percentage_sum = max(0, stats.percentage_sum + change['percentage_sum'])
+            for field in ('score_histogram', 'percentage_counts'):
+                current = getattr(stats, field) or [0] * len(change[field])
+                setattr(stats, field, [max(0, a + b) for a, b in zip(current, change[field])])
+        QuizScoreStats.objects.using(db_alias).bulk_update(
+            rows, ['attempts', 'percentage_sum', 'score_histogram', 'percentage_counts']
+        )
+    return len(rows)
+
+
+def combine_score_stats(quiz, rows):
+    """Unsaved QuizScoreStats adding up the distributions of several rows, e.g. a quiz and its online copy."""
+    distribution = _empty_distribution()
+    for stats in rows:
+        distribution['attempts'] += stats.attempts
+        distribution['percentage_sum'] += stats.percentage_sum
+        for field in ('score_histogram', 'percentage_counts'):
+            for index, count in enumerate(getattr(stats, field) or []):
+                distribution[field][index] += count
+    return QuizScoreStats(quiz=quiz, **distribution)
+
+
+def rebuild_score_stats(db_alias, quiz_ids=None, batch_size=BATCH_SIZE):
+    """
+    Recompute QuizScoreStats rows from TestAttempt and AttemptSummary, for
+    every quiz or only for quiz_ids.
+
+    It reads every attempt of the quizzes without locking, so it is meant
+    for backfills. Deletions use remove_scores instead.
+    """
+    if quiz_ids is not None:
+        quiz_ids = list(quiz_ids)
+        return sum(
+            _rebuild(db_alias, quiz_ids[start:start + batch_size], batch_size)
+            for start in range(0, len(quiz_ids), batch_size)
+        )
+    return _rebuild(db_alias, None, batch_size)
+
+
+def _rebuild(db_alias, quiz_ids, batch_size):
+    attempts = TestAttempt.objects.using(db_alias)
+    summaries = AttemptSummary.objects.using(db_alias)
+    existing = QuizScoreStats.objects.using(db_alias)
+    if quiz_ids is not None:
+        attempts = attempts.filter(quiz_id__in=quiz_ids)
+        summaries = summaries.filter(quiz_id__in=quiz_ids)
+        existing = existing.filter(quiz_id__in=quiz_ids)
+
+    distributions = defaultdict(_empty_distribution)
+    attempts = attempts.order_by().values_list('quiz_id', 'score', 'total_questions')
+    for quiz_id, score, total_questions in attempts.iterator(chunk_size=batch_size):
+        _add(distributions[quiz_id], score, total_questions)
+
+    summaries = summaries.order_by().values_list('quiz_id', 'score_histogram', 'percentage_sum')
+    for quiz_id, histogram, percentage_sum in summaries.iterator(chunk_size=batch_size):
+        _add_summary(distributions[quiz_id], histogram, percentage_sum)
+
+    rows = [QuizScoreStats(quiz_id=quiz_id, **distribution) for quiz_id, distribution in distributions.items()]
+    with transaction.atomic(using=db_alias):
+        existing.delete()
+        QuizScoreStats.objects.using(db_alias).bulk_create(rows, batch_size=batch_size)
+    return len(rows)
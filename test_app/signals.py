@@ -0,0 +1,28 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Category, Choice, Question, Quiz
+from .reference import bump_categories_version
+
+
+def touch_quiz(db_alias, **lookup):
+    # queryset.update() skips auto_now, so the timestamp is set explicitly
+    Quiz.objects.using(db_alias).filter(**lookup).update(updated_at=timezone.now())
+
+
+@receiver([post_save, post_delete], sender=Question)
+def question_changed(sender, instance, using, **kwargs):
+    touch_quiz(using, pk=instance.quiz_id)
+
+
+@receiver([post_save, post_delete], sender=Choice)
+def choice_changed(sender, instance, using, **kwargs):
+    touch_quiz(using, questions__id=instance.question_id)
+
+
+@receiver([post_save, post_delete], sender=Category)
+def category_changed(sender, instance, using, **kwargs):
+    # Bumped before commit, another worker could cache the old rows under the new version
+    transaction.on_commit(lambda: bump_categories_version(using), using=using)
@@ -0,0 +1,106 @@
+import hashlib
+import json
+
+from django.core.cache import cache
+
+from .models import QuizSnapshot
+
+# Snapshots never change, so their content can stay cached indefinitely
+SNAPSHOT_CACHE_TIMEOUT = None
+
+
+def serialize_quiz(quiz):
+    """Content of a quiz and its questions, with choices and correct answers."""
+    questions = quiz.questions.using(quiz._state.db).prefetch_related('choices').order_by('pk')
+    return {
+        'title': quiz.title,
+        'questions': [
+            {
+                'id': question.pk,
+                'text': question.text,
+                'choices': [
+                    {'id': choice.pk, 'text': choice.text, 'is_correct': choice.is_correct}
+                    for choice in sorted(question.choices.all(), key=lambda c: c.pk)
+                ],
+            }
+            for question in questions
+        ],
+    }
+
+
+def content_hash(quiz_id, content):
+    raw = json.dumps([quiz_id, content], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _version_key(quiz):
+    return f'quiz_snapshot_version:{quiz._state.db}:{quiz.pk}:{quiz.updated_at.timestamp()}'
+
+
+def _content_key(db_alias, snapshot_id):
+    return f'quiz_snapshot:{db_alias}:{snapshot_id}'
+
+
+def get_current_snapshot(quiz):
+    """
+    Return the QuizSnapshot of the quiz as it is now, creating it if needed.
+
+    The snapshot id is cached per Quiz.updated_at, so the questions are
+    only serialized once per version of the quiz.
+    """
+    db_alias = quiz._state.db
+    version_key = _version_key(quiz)
+    snapshot_id = cache.get(version_key)
+    if snapshot_id is not None:
+        content = get_snapshot_content(db_alias, snapshot_id)
+        if content is not None:
+            return QuizSnapshot(pk=snapshot_id, quiz=quiz, content=content)
+
+    content = serialize_quiz(quiz)
+    snapshot, _ = QuizSnapshot.objects.using(db_alias).get_or_create(
+        content_hash=content_hash(quiz.pk, content),
+        defaults={'quiz': quiz, 'content': content},
+    )
+    cache.set(version_key, snapshot.pk, timeout=SNAPSHOT_CACHE_TIMEOUT)
+    cache.set(_content_key(db_alias, snapshot.pk), snapshot.content, timeout=SNAPSHOT_CACHE_TIMEOUT)
+    return snapshot
+
+
+def get_snapshot_content(db_alias, snapshot_id):
+    key = _content_key(db_alias, snapshot_id)
+    content = cache.get(key)
+    if content is None:
+        content = (
+            QuizSnapshot.objects.using(db_alias)
+            .filter(pk=snapshot_id)
+            .values_list('content', flat=True)
+            .first()
+        )
+        if content is not None:
+            cache.set(key, content, timeout=SNAPSHOT_CACHE_TIMEOUT)
+    return content
+
+
+def grade(content, answers):
+    """
+    Grade submitted answers against snapshot content.
+
+    `answers` maps question ids to the selected choice id (or None).
+    Returns the score and {question_id: {'selected_id', 'is_correct'}}.
+    """
+    score = 0
+    user_answers = {}
+    for question in content['questions']:
+        choices = {choice['id']: choice for choice in question['choices']}
+        try:
+            selected = choices.get(int(answers.get(question['id'])))
+        except (TypeError, ValueError):
+            selected = None
+        is_correct = bool(selected and selected['is_correct'])
+        if is_correct:
+            score += 1
+        user_answers[question['id']] = {
+            'selected_id': selected['id'] if selected else None,
+            'is_correct': is_correct,
+        }
+    return score, user_answers
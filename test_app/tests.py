@@ -1,3 +1,814 @@
-from django.test import TestCase
+import asyncio
+import json
+import math
+from datetime import date, timedelta
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import live
+from .admin import EstimatedCountPaginator
+from .deletion import delete_attempts, delete_published_copy, delete_quizzes, purge_attempts
+from .models import (
+    HISTOGRAM_BINS, AttemptSummary, Category, Choice, LegacyQuizRoute, Question, Quiz, QuizScoreStats,
+    QuizSnapshot, RelatedQuiz, TestAttempt,
+)
+from .popularity import recompute_attempt_counts, record_attempt
+from .recommendations import build_related_quizzes, iter_neighbours
+from .reference import get_categories, get_categories_version
+from .retention import roll_up_attempts
+from .routing import ObjectRef, ObjectRefConverter, make_ref, resolve_legacy_quiz
+from .scores import PERCENTAGE_BUCKETS, rebuild_score_stats, record_scores
+from .snapshots import grade
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def create_quiz(db_alias, user, title='Quiz', questions=2, category=None, **fields):
+    if category is None:
+        category = Category.objects.using(db_alias).create(title='Category', image='category.png')
+    quiz = Quiz.objects.using(db_alias).create(user=user, title=title, category=category, **fields)
+    for number in range(questions):
+        question = Question.objects.using(db_alias).create(quiz=quiz, text=f'Question {number}')
+        Choice.objects.using(db_alias).create(question=question, text='Right', is_correct=True)
+        Choice.objects.using(db_alias).create(question=question, text='Wrong')
+    return quiz
+
+
+def create_attempt(quiz, user, score, total_questions=2, date_taken=None):
+    db_alias = quiz._state.db
+    attempt = TestAttempt.objects.using(db_alias).create(
+        user=user, quiz=quiz, score=score, total_questions=total_questions,
+    )
+    if date_taken is not None:
+        TestAttempt.objects.using(db_alias).filter(pk=attempt.pk).update(date_taken=date_taken)
+    return attempt
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+
+class ConditionalGetTests(CacheTestCase):
+    databases = {'default', 'online'}
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create(username='teacher')
+        self.quiz = create_quiz('default', self.user)
+        online_user = User.objects.using('online').create(username='teacher')
+        self.online_quiz = create_quiz('online', online_user, public=True)
+
+    def test_unchanged_quiz_page_answers_304(self):
+        url = self.quiz.get_absolute_url()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        again = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again['ETag'], response['ETag'])
+
+    def test_edited_quiz_gets_new_etag(self):
+        url = self.quiz.get_absolute_url()
+        etag = self.client.get(url)['ETag']
+        Question.objects.create(quiz=self.quiz, text='Added')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_feed_etag_changes_on_delete_and_category_rename(self):
+        etag = self.client.get('/')['ETag']
+        category = self.online_quiz.category
+        with self.captureOnCommitCallbacks(using='online', execute=True):
+            category.title = 'Renamed'
+            category.save(using='online')
+        renamed = self.client.get('/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(renamed.status_code, 200)
+
+        self.online_quiz.delete()
+        deleted = self.client.get('/', HTTP_IF_NONE_MATCH=renamed['ETag'])
+        self.assertEqual(deleted.status_code, 200)
+        self.assertNotEqual(deleted['ETag'], renamed['ETag'])
+
+    def test_etag_is_per_user_and_private_when_signed_in(self):
+        anonymous = self.client.get('/')
+        self.assertIn('public', anonymous['Cache-Control'])
+        self.client.force_login(self.user)
+        signed_in = self.client.get('/')
+        self.assertIn('private', signed_in['Cache-Control'])
+        self.assertNotEqual(signed_in['ETag'], anonymous['ETag'])
+        self.assertFalse(signed_in.has_header('Last-Modified'))
+
+
+class AttemptCountTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='student')
+        self.quiz = create_quiz('default', self.user)
+
+    def test_record_attempt_adds_to_the_stored_count(self):
+        stale = Quiz.objects.get(pk=self.quiz.pk)
+        record_attempt(self.quiz)
+        # An instance loaded before the first increment must not overwrite it
+        record_attempt(stale, count=2)
+        self.quiz.refresh_from_db()
+        self.assertEqual(self.quiz.attempts_count, 3)
+
+    def test_recompute_counts_attempts_and_rolled_up_summaries(self):
+        other = create_quiz('default', self.user, title='Other', category=self.quiz.category)
+        create_attempt(self.quiz, self.user, 1)
+        create_attempt(self.quiz, self.user, 2)
+        AttemptSummary.objects.create(user=self.user, quiz=self.quiz, month=date(2024, 1, 1), attempts=5)
+        Quiz.objects.filter(pk=other.pk).update(attempts_count=7)
+
+        recompute_attempt_counts('default')
+
+        counts = dict(Quiz.objects.values_list('pk', 'attempts_count'))
+        self.assertEqual(counts, {self.quiz.pk: 7, other.pk: 0})
+
+
+class RelatedQuizzesTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        author = User.objects.create(username='teacher')
+        category = Category.objects.create(title='Category', image='category.png')
+        self.quizzes = [
+            create_quiz('default', author, title=f'Quiz {n}', questions=0, category=category, public=True)
+            for n in range(5)
+        ]
+        taken = [[0, 1], [0, 1, 2], [0, 2], [1, 3], [3, 4], [0, 1, 4]]
+        for number, indexes in enumerate(taken):
+            user = User.objects.create(username=f'student{number}')
+            for index in indexes:
+                create_attempt(self.quizzes[index], user, 1)
+        self.taken = [{self.quizzes[index].pk for index in indexes} for indexes in taken]
+
+    def brute_force(self, pk, candidates, limit):
+        takers = {quiz.pk: sum(quiz.pk in row for row in self.taken) for quiz in self.quizzes}
+        scores = []
+        for other in candidates:
+            both = sum(pk in row and other in row for row in self.taken)
+            if other != pk and both:
+                scores.append((both / math.sqrt(takers[pk] * takers[other]), other))
+        return sorted(scores, reverse=True)[:limit]
+
+    def test_blocks_match_brute_force_cosine(self):
+        candidates = {quiz.pk for quiz in self.quizzes}
+        # Fewer counters than candidates forces one quiz per block
+        neighbours = dict(iter_neighbours('default', candidates, limit=2, max_counters=2))
+        for pk, top in neighbours.items():
+            self.assertEqual(top, self.brute_force(pk, candidates, 2))
+        self.assertEqual(set(neighbours), candidates)
+
+    def test_build_tops_up_from_the_category(self):
+        build_related_quizzes('default', limit=3)
+        # Quiz 3 was only taken together with quizzes 1 and 4
+        pk = self.quizzes[3].pk
+        related = list(RelatedQuiz.objects.filter(quiz_id=pk).values_list('score', 'related_id'))
+        expected = self.brute_force(pk, {quiz.pk for quiz in self.quizzes}, 3)
+        self.assertEqual(len(expected), 2)
+        self.assertEqual(related[:2], [(round(score, 6), other) for score, other in expected])
+        self.assertEqual(related[2][0], 0)
+        self.assertNotIn(related[2][1], {pk} | {other for _, other in expected})
+
+
+class DeleteQuizzesTests(TestCase):
+    databases = {'default', 'online'}
+
+    def setUp(self):
+        self.user = User.objects.create(username='teacher')
+        self.quiz = create_quiz('default', self.user)
+        self.other = create_quiz('default', self.user, title='Other')
+
+    def test_deletes_quiz_and_dependent_rows(self):
+        snapshot = QuizSnapshot.objects.create(quiz=self.quiz, content_hash='a', content={})
+        TestAttempt.objects.create(user=self.user, quiz=self.quiz, score=1, total_questions=2, snapshot=snapshot)
+        AttemptSummary.objects.create(user=self.user, quiz=self.quiz, month=date(2024, 1, 1), attempts=1)
+        QuizScoreStats.objects.create(quiz=self.quiz, attempts=1)
+        RelatedQuiz.objects.create(quiz=self.quiz, related=self.other, score=1)
+        RelatedQuiz.objects.create(quiz=self.other, related=self.quiz, score=1)
+
+        delete_quizzes('default', [self.quiz.pk])
+
+        self.assertFalse(Quiz.objects.filter(pk=self.quiz.pk).exists())
+        self.assertFalse(Question.objects.filter(quiz_id=self.quiz.pk).exists())
+        self.assertFalse(Choice.objects.filter(question__quiz_id=self.quiz.pk).exists())
+        for model in (TestAttempt, AttemptSummary, QuizSnapshot, QuizScoreStats):
+            self.assertFalse(model.objects.filter(quiz_id=self.quiz.pk).exists(), model.__name__)
+        self.assertFalse(RelatedQuiz.objects.exists())
+
+    def test_leaves_other_quizzes_alone(self):
+        delete_quizzes('default', [self.quiz.pk])
+        self.assertTrue(Quiz.objects.filter(pk=self.other.pk).exists())
+        self.assertEqual(Choice.objects.filter(question__quiz=self.other).count(), 4)
+
+    def test_published_copy_is_found_by_online_pk(self):
+        online_user = User.objects.using('online').create(username='teacher')
+        copy = create_quiz('online', online_user)
+        same_title = create_quiz('online', online_user)
+        self.quiz.online_pk = copy.pk
+
+        delete_published_copy(self.quiz)
+
+        self.assertFalse(Quiz.objects.using('online').filter(pk=copy.pk).exists())
+        self.assertTrue(Quiz.objects.using('online').filter(pk=same_title.pk).exists())
+
+    def test_published_copy_without_online_pk_is_kept(self):
+        online_user = User.objects.using('online').create(username='teacher')
+        create_quiz('online', online_user, title=self.quiz.title)
+
+        self.assertEqual(delete_published_copy(self.quiz), 0)
+        self.assertEqual(Quiz.objects.using('online').count(), 1)
+
+
+class PurgeAttemptsTests(TestCase):
+    databases = {'default', 'online'}
+
+    def setUp(self):
+        self.user = User.objects.create(username='student')
+        self.other = User.objects.create(username='other')
+        self.quiz = create_quiz('default', self.user)
+
+    def test_deletes_attempts_and_summaries_of_the_user_only(self):
+        for score in (0, 1, 2):
+            create_attempt(self.quiz, self.user, score)
+        create_attempt(self.quiz, self.other, 2)
+        AttemptSummary.objects.create(user=self.user, quiz=self.quiz, month=date(2024, 1, 1), attempts=3)
+
+        self.assertEqual(purge_attempts('default', self.user.pk, batch_size=2), 3)
+
+        self.assertFalse(TestAttempt.objects.filter(user=self.user).exists())
+        self.assertFalse(AttemptSummary.objects.filter(user=self.user).exists())
+        self.assertEqual(TestAttempt.objects.filter(user=self.other).count(), 1)
+
+    def test_delete_history_purges_both_databases(self):
+        create_attempt(self.quiz, self.user, 1)
+        online_user = User.objects.using('online').create(username='student')
+        create_attempt(create_quiz('online', online_user), online_user, 1)
+        self.client.force_login(self.user)
+
+        response = self.client.post('/my_history/delete/')
+
+        self.assertRedirects(response, '/my_history/', fetch_redirect_response=False)
+        self.assertFalse(TestAttempt.objects.exists())
+        self.assertFalse(TestAttempt.objects.using('online').exists())
+
+
+class RollUpAttemptsTests(TestCase):
+    databases = {'default', 'online'}
+
+    def setUp(self):
+        self.user = User.objects.create(username='student')
+        self.quiz = create_quiz('default', self.user)
+        self.old = timezone.now() - timedelta(days=400)
+
+    def test_merges_into_existing_summary(self):
+        month = self.old.date().replace(day=1)
+        histogram = [0] * HISTOGRAM_BINS
+        histogram[5] = 1
+        AttemptSummary.objects.create(
+            user=self.user, quiz=self.quiz, month=month,
+            attempts=1, best_percentage=50, percentage_sum=50, score_histogram=histogram,
+        )
+        create_attempt(self.quiz, self.user, 2, date_taken=self.old)
+        create_attempt(self.quiz, self.user, 0, date_taken=self.old)
+        recent = create_attempt(self.quiz, self.user, 1)
+
+        self.assertEqual(roll_up_attempts('default', days=365, batch_size=1), 2)
+
+        summary = AttemptSummary.objects.get(user=self.user, quiz=self.quiz, month=month)
+        self.assertEqual(summary.attempts, 3)
+        self.assertEqual(summary.best_percentage, 100)
+        self.assertEqual(summary.percentage_sum, 150)
+        self.assertEqual(summary.score_histogram[0], 1)
+        self.assertEqual(summary.score_histogram[5], 1)
+        self.assertEqual(summary.score_histogram[HISTOGRAM_BINS - 1], 1)
+        self.assertEqual(list(TestAttempt.objects.values_list('pk', flat=True)), [recent.pk])
+
+    def test_history_page_offers_delete_for_rolled_up_attempts_only(self):
+        create_attempt(self.quiz, self.user, 1, date_taken=self.old)
+        roll_up_attempts('default', days=365)
+        self.client.force_login(self.user)
+
+        response = self.client.get('/my_history/')
+
+        self.assertContains(response, 'Delete history')
+        self.assertContains(response, 'No Recent Attempts')
+        self.assertContains(response, 'Earlier Months')
+
+    def test_running_again_counts_nothing_twice(self):
+        create_attempt(self.quiz, self.user, 1, date_taken=self.old)
+        roll_up_attempts('default', days=365)
+        self.assertEqual(roll_up_attempts('default', days=365), 0)
+        self.assertEqual(AttemptSummary.objects.get().attempts, 1)
+
+
+class GradeTests(TestCase):
+    content = {
+        'questions': [
+            {'id': 1, 'choices': [{'id': 10, 'is_correct': True}, {'id': 11, 'is_correct': False}]},
+            {'id': 2, 'choices': [{'id': 20, 'is_correct': False}, {'id': 21, 'is_correct': True}]},
+            {'id': 3, 'choices': [{'id': 30, 'is_correct': True}]},
+        ],
+    }
+
+    def test_counts_correct_answers(self):
+        score, answers = grade(self.content, {1: '10', 2: '20', 3: 30})
+        self.assertEqual(score, 2)
+        self.assertEqual(answers[1], {'selected_id': 10, 'is_correct': True})
+        self.assertEqual(answers[2], {'selected_id': 20, 'is_correct': False})
+
+    def test_ignores_missing_invalid_and_foreign_choices(self):
+        # 21 belongs to question 2, it cannot answer question 1
+        score, answers = grade(self.content, {1: '21', 2: 'abc'})
+        self.assertEqual(score, 0)
+        for question_id in (1, 2, 3):
+            self.assertEqual(answers[question_id], {'selected_id': None, 'is_correct': False})
+
+
+class SnapshotResultsTests(CacheTestCase):
+    databases = {'default', 'online'}
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create(username='student')
+        self.quiz = create_quiz('default', self.user)
+        self.client.force_login(self.user)
+
+    def take(self):
+        data = {}
+        for number, question in enumerate(self.quiz.questions.order_by('pk')):
+            # Right on the first question, wrong on the others
+            data[f'question_{question.pk}'] = question.choices.get(is_correct=number == 0).pk
+        return self.client.post(reverse('take_quiz', args=[self.quiz]), data)
+
+    def test_results_show_the_quiz_as_it_was_taken(self):
+        response = self.take()
+        attempt = TestAttempt.objects.get()
+        self.assertRedirects(response, reverse('quiz_results', args=[attempt]), fetch_redirect_response=False)
+        self.assertEqual((attempt.score, attempt.total_questions), (1, 2))
+
+        question = self.quiz.questions.order_by('pk').first()
+        question.text = 'Edited afterwards'
+        question.save()
+
+        page = self.client.get(reverse('quiz_results', args=[attempt]))
+        self.assertContains(page, 'Question 0')
+        self.assertNotContains(page, 'Edited afterwards')
+
+    def test_unchanged_quiz_reuses_its_snapshot(self):
+        self.take()
+        self.take()
+        self.assertEqual(QuizSnapshot.objects.count(), 1)
+        self.assertEqual(len({attempt.snapshot_id for attempt in TestAttempt.objects.all()}), 1)
+
+
+class APITests(CacheTestCase):
+    databases = {'default', 'online'}
+
+    def setUp(self):
+        super().setUp()
+        # The feed is served from the online database when it is reachable
+        self.author = User.objects.using('online').create(username='teacher')
+        self.category = Category.objects.using('online').create(title='Category', image='category.png')
+        self.quizzes = [
+            create_quiz('online', self.author, title=f'Quiz {n}', category=self.category, public=True)
+            for n in range(5)
+        ]
+        Quiz.objects.using('online').update(date_created=timezone.now())
+
+    def get_json(self, url, **extra):
+        response = self.client.get(url, **extra)
+        return response, response.json() if response.status_code == 200 else None
+
+    def test_feed_pages_through_quizzes_with_the_same_date(self):
+        seen, cursor = [], None
+        while True:
+            _, data = self.get_json('/api/v1/quizzes/?limit=2' + (f'&cursor={cursor}' if cursor else ''))
+            seen += [item['id'] for item in data['results']]
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(seen, [f'online-{quiz.pk}' for quiz in reversed(self.quizzes)])
+
+    def test_invalid_parameters_answer_400(self):
+        for query in ('category=abc', 'limit=x', 'cursor=bogus', 'fields=secret'):
+            response = self.client.get(f'/api/v1/quizzes/?{query}')
+            self.assertEqual(response.status_code, 400, query)
+            self.assertIn('error', response.json())
+
+    def test_detail_hides_correct_answers(self):
+        _, data = self.get_json(f'/api/v1/quizzes/online-{self.quizzes[0].pk}/')
+        self.assertEqual(data['id'], f'online-{self.quizzes[0].pk}')
+        choices = data['questions'][0]['choices']
+        self.assertEqual(len(choices), 2)
+        self.assertEqual(set(choices[0]), {'id', 'text'})
+
+    def test_counters_and_categories_change_the_etag(self):
+        quiz = self.quizzes[0]
+        for url in ('/api/v1/quizzes/?fields=id,attempts_count', f'/api/v1/quizzes/online-{quiz.pk}/?fields=id,attempts_count'):
+            response, _ = self.get_json(url)
+            record_attempt(quiz)
+            response, _ = self.get_json(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 200, url)
+
+        url = f'/api/v1/quizzes/online-{quiz.pk}/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(using='online', execute=True):
+            self.category.title = 'Renamed'
+            self.category.save(using='online')
+        response, data = self.get_json(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['category'], 'Renamed')
+
+    def test_attempts_of_both_databases_page_without_gaps(self):
+        student = User.objects.create(username='student')
+        online_student = User.objects.using('online').create(username='student')
+        local_quiz = create_quiz('default', student)
+        moment = timezone.now()
+        for _ in range(3):
+            create_attempt(local_quiz, student, 1, date_taken=moment)
+            create_attempt(self.quizzes[0], online_student, 1, date_taken=moment)
+        self.client.force_login(student)
+
+        seen, cursor = [], None
+        while True:
+            _, data = self.get_json('/api/v1/attempts/?limit=2' + (f'&cursor={cursor}' if cursor else ''))
+            seen += data['results']
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(len({item['id'] for item in seen}), 6)
+        self.assertEqual(
+            {item['quiz'] for item in seen},
+            {f'local-{local_quiz.pk}', f'online-{self.quizzes[0].pk}'},
+        )
+
+    def test_attempts_require_sign_in(self):
+        self.assertEqual(self.client.get('/api/v1/attempts/').status_code, 401)
+
+
+class FakeSocket:
+    """The receive/send pair the ASGI server hands to a WebSocket application."""
+
+    def __init__(self):
+        self.incoming = asyncio.Queue()
+        self.sent = []
+
+    async def receive(self):
+        return await self.incoming.get()
+
+    async def send(self, message):
+        self.sent.append(message)
+
+    def messages(self, kind):
+        return [
+            json.loads(message['text']) for message in self.sent
+            if message['type'] == 'websocket.send' and json.loads(message['text'])['type'] == kind
+        ]
+
+
+class LiveSessionTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.teacher = User.objects.create(username='teacher')
+        self.student = User.objects.create(username='student')
+        self.quiz = create_quiz('default', self.teacher)
+        self.ref = ObjectRef('default', self.quiz.pk)
+        self.application = live.LiveQuizApplication(None)
+        self.tasks = []
+        self.addCleanup(live.sessions.clear)
+
+    async def connect(self, user):
+        socket = FakeSocket()
+        socket.incoming.put_nowait({'type': 'websocket.connect'})
+        scope = {'type': 'websocket', 'path': f'/ws/live/{make_ref(*self.ref)}/', 'user': user, 'headers': []}
+        self.tasks.append((socket, asyncio.create_task(self.application(scope, socket.receive, socket.send))))
+        await self.wait_for(lambda: socket.sent)
+        return socket
+
+    def act(self, socket, **data):
+        socket.incoming.put_nowait({'type': 'websocket.receive', 'text': json.dumps(data)})
+
+    async def wait_for(self, condition):
+        for _ in range(200):
+            if condition():
+                return
+            await asyncio.sleep(0.01)
+        self.fail('condition not reached')
+
+    async def disconnect_all(self):
+        for socket, task in self.tasks:
+            socket.incoming.put_nowait({'type': 'websocket.disconnect'})
+            await task
+
+    async def answer_first_question(self):
+        host = await self.connect(self.teacher)
+        student = await self.connect(self.student)
+        self.act(host, action='next')
+        await self.wait_for(lambda: student.messages('question'))
+        question = student.messages('question')[0]['question']
+        right = await sync_to_async(
+            lambda: Choice.objects.get(question_id=question['id'], is_correct=True).pk
+        )()
+        self.act(student, action='answer', question=question['id'], choice=right)
+        await self.wait_for(lambda: live.sessions[self.ref].answers)
+        return host, student
+
+    def attempts(self):
+        return sync_to_async(lambda: list(TestAttempt.objects.values_list('user_id', 'score', 'total_questions')))()
+
+    async def test_finish_saves_attempts_and_sends_scores(self):
+        host, student = await self.answer_first_question()
+        self.assertTrue(host.messages('question'))
+
+        self.act(host, action='finish')
+        await self.wait_for(lambda: student.messages('results'))
+
+        self.assertEqual(student.messages('results'), [{'type': 'results', 'score': 1, 'total': 2}])
+        self.assertEqual(await self.attempts(), [(self.student.pk, 1, 2)])
+        self.assertNotIn(self.ref, live.sessions)
+        await self.disconnect_all()
+
+    async def test_abandoned_session_is_saved_after_the_grace_period(self):
+        host, student = await self.answer_first_question()
+        with mock.patch.object(live, 'HOST_GRACE_PERIOD', 0):
+            host.incoming.put_nowait({'type': 'websocket.disconnect'})
+            await self.wait_for(lambda: self.ref not in live.sessions)
+        self.assertEqual(await self.attempts(), [(self.student.pk, 1, 2)])
+        await self.disconnect_all()
+
+    async def test_failed_save_keeps_the_session_for_a_retry(self):
+        host, student = await self.answer_first_question()
+        with mock.patch.object(live, 'persist_attempts', side_effect=DatabaseError('unreachable')):
+            self.act(host, action='finish')
+            await self.wait_for(lambda: host.messages('error'))
+
+        session = live.sessions[self.ref]
+        self.assertEqual(len(session.answers), 1)
+        self.assertFalse(session.saving)
+        self.assertIsNotNone(session.expiry)
+
+        self.act(host, action='finish')
+        await self.wait_for(lambda: self.ref not in live.sessions)
+        self.assertEqual(await self.attempts(), [(self.student.pk, 1, 2)])
+        await self.disconnect_all()
+
+
+class CategoriesCacheTests(CacheTestCase):
+    def test_categories_reload_after_a_committed_change(self):
+        category = Category.objects.create(title='Maths', image='maths.png')
+        self.assertEqual([c.title for c in get_categories()], ['Maths'])
+        with self.assertNumQueries(0):
+            get_categories()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            category.title = 'Algebra'
+            category.save()
+        self.assertEqual([c.title for c in get_categories()], ['Algebra'])
+
+    def test_version_is_bumped_on_commit_only(self):
+        version = get_categories_version()
+        with self.captureOnCommitCallbacks() as callbacks:
+            Category.objects.create(title='Maths', image='maths.png')
+            self.assertEqual(get_categories_version(), version)
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        self.assertNotEqual(get_categories_version(), version)
+
+    def test_each_database_has_its_own_version(self):
+        version = get_categories_version('online')
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(title='Maths', image='maths.png')
+        self.assertEqual(get_categories_version('online'), version)
+
+
+class QuizScoreStatsTests(TestCase):
+    def make_stats(self, percentages):
+        counts = [0] * PERCENTAGE_BUCKETS
+        for percentage in percentages:
+            counts[percentage] += 1
+        return QuizScoreStats(attempts=len(percentages), percentage_sum=sum(percentages), percentage_counts=counts)
+
+    def test_percentile_uses_nearest_rank(self):
+        stats = self.make_stats([10, 20, 30, 40])
+        self.assertEqual(stats.get_percentile(0), 10)
+        self.assertEqual(stats.get_percentile(0.25), 10)
+        self.assertEqual(stats.get_percentile(0.5), 20)
+        self.assertEqual(stats.get_percentile(0.75), 30)
+        self.assertEqual(stats.get_percentile(1), 40)
+        self.assertEqual(stats.get_median(), 20)
+
+    def test_empty_stats(self):
+        stats = QuizScoreStats()
+        self.assertEqual(stats.get_percentile(0.5), 0)
+        self.assertEqual(stats.get_mean_percentage(), 0)
+
+    def test_record_scores_matches_rebuild(self):
+        user = User.objects.create(username='student')
+        quiz = create_quiz('default', user)
+        attempts = [create_attempt(quiz, user, score) for score in (0, 1, 2, 2)]
+        recorded = record_scores(quiz, attempts)
+
+        rebuild_score_stats('default', [quiz.pk])
+
+        rebuilt = QuizScoreStats.objects.get(quiz=quiz)
+        self.assertEqual(recorded.attempts, rebuilt.attempts)
+        self.assertEqual(recorded.percentage_sum, rebuilt.percentage_sum)
+        self.assertEqual(recorded.percentage_counts, rebuilt.percentage_counts)
+        self.assertEqual(rebuilt.get_median(), 50)
+
+
+class ScoreStatsDeletionTests(TestCase):
+    databases = {'default', 'online'}
+
+    def setUp(self):
+        self.user = User.objects.create(username='student')
+        self.other = User.objects.create(username='other')
+        self.quiz = create_quiz('default', self.user)
+
+    def no_rebuild(self):
+        # Deletions adjust the rows in place, they never rescan the quiz's attempts
+        return mock.patch('test_app.scores._rebuild', side_effect=AssertionError('full rebuild'))
+
+    def take(self, user, score):
+        attempt = create_attempt(self.quiz, user, score)
+        record_scores(self.quiz, [attempt])
+        return attempt
+
+    def assertStatsMatchRebuild(self):
+        stats = QuizScoreStats.objects.values('attempts', 'percentage_sum', 'score_histogram', 'percentage_counts')
+        kept = list(stats.get(quiz=self.quiz).values())
+        rebuild_score_stats('default', [self.quiz.pk])
+        self.assertEqual(kept, list(stats.get(quiz=self.quiz).values()))
+
+    def test_delete_attempts_subtracts_only_the_deleted_ones(self):
+        first = self.take(self.user, 0)
+        self.take(self.other, 2)
+        with self.no_rebuild():
+            delete_attempts('default', [first.pk])
+        # Submitted after the deletion, it must still be counted
+        self.take(self.other, 1)
+
+        stats = QuizScoreStats.objects.get(quiz=self.quiz)
+        self.assertEqual((stats.attempts, stats.percentage_sum), (2, 150))
+        self.assertStatsMatchRebuild()
+
+    def test_purge_subtracts_attempts_and_rolled_up_summaries(self):
+        old = timezone.now() - timedelta(days=400)
+        for score in (0, 1, 2):
+            create_attempt(self.quiz, self.user, score, date_taken=old)
+        roll_up_attempts('default', days=365)
+        self.take(self.user, 2)
+        self.take(self.other, 1)
+        rebuild_score_stats('default')
+
+        with self.no_rebuild():
+            purge_attempts('default', self.user.pk, batch_size=1)
+
+        stats = QuizScoreStats.objects.get(quiz=self.quiz)
+        self.assertEqual((stats.attempts, stats.percentage_sum), (1, 50))
+        self.assertStatsMatchRebuild()
+
+    def test_stats_link_only_for_local_quizzes_of_the_owner(self):
+        self.client.force_login(self.user)
+        stats_url = reverse('quiz_stats', args=[self.quiz.pk])
+        self.assertContains(self.client.get(self.quiz.get_absolute_url()), stats_url)
+
+        # Same username and pk online, the link would open the local quiz
+        online_user = User.objects.using('online').create(username='student')
+        online_quiz = create_quiz('online', online_user)
+        self.assertEqual(online_quiz.pk, self.quiz.pk)
+        self.assertNotContains(self.client.get(online_quiz.get_absolute_url()), stats_url)
+
+    def test_stats_page_adds_the_published_copy(self):
+        online_user = User.objects.using('online').create(username='other')
+        copy = create_quiz('online', online_user)
+        Quiz.objects.filter(pk=self.quiz.pk).update(online_pk=copy.pk)
+        self.take(self.other, 2)
+        record_scores(copy, [create_attempt(copy, online_user, 0)])
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse('quiz_stats', args=[self.quiz.pk]))
+
+        self.assertEqual(response.context['stats'].attempts, 2)
+        self.assertEqual(response.context['stats'].percentage_sum, 100)
+
+
+class AdminTests(CacheTestCase):
+    databases = {'default', 'online'}
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser('admin', password='Admin-Pass-1')
+        self.student = User.objects.create(username='student')
+        self.quiz = create_quiz('default', self.admin)
+        self.attempts = [create_attempt(self.quiz, self.student, score) for score in (0, 1, 2)]
+        self.client.force_login(self.admin)
+
+    def run_action(self, model, action, pks):
+        url = reverse(f'admin:test_app_{model}_changelist')
+        return self.client.post(url, {'action': action, '_selected_action': pks})
+
+    def test_changelist_offers_only_batched_deletes(self):
+        response = self.client.get(reverse('admin:test_app_testattempt_changelist'))
+        actions = [value for value, _ in response.context['action_form'].fields['action'].choices]
+        self.assertNotIn('delete_selected', actions)
+        self.assertIn('delete_selected_attempts', actions)
+
+    def test_delete_selected_attempts_keeps_the_others(self):
+        self.run_action('testattempt', 'delete_selected_attempts', [self.attempts[0].pk])
+        self.assertEqual(
+            set(TestAttempt.objects.values_list('pk', flat=True)),
+            {attempt.pk for attempt in self.attempts[1:]},
+        )
+
+    def test_delete_attempts_of_selected_users(self):
+        other = create_attempt(self.quiz, self.admin, 1)
+        self.run_action('testattempt', 'delete_attempts_of_selected_users', [self.attempts[0].pk])
+        self.assertEqual(list(TestAttempt.objects.values_list('pk', flat=True)), [other.pk])
+
+    def test_delete_selected_quizzes_removes_the_published_copy(self):
+        online_admin = User.objects.using('online').create(username='admin')
+        copy = create_quiz('online', online_admin)
+        unrelated = create_quiz('online', online_admin)
+        Quiz.objects.filter(pk=self.quiz.pk).update(public=True, online_pk=copy.pk)
+
+        self.run_action('quiz', 'delete_selected_quizzes', [self.quiz.pk])
+
+        self.assertFalse(Quiz.objects.exists())
+        self.assertFalse(TestAttempt.objects.exists())
+        self.assertEqual(list(Quiz.objects.using('online').values_list('pk', flat=True)), [unrelated.pk])
+
+    def test_changelist_count_is_cached(self):
+        self.assertEqual(EstimatedCountPaginator(TestAttempt.objects.order_by('pk'), 50).count, 3)
+        create_attempt(self.quiz, self.student, 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(EstimatedCountPaginator(TestAttempt.objects.order_by('pk'), 50).count, 3)
+
+
+class RefRoutingTests(CacheTestCase):
+    databases = {'default', 'online'}
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create(username='student')
+        self.online_user = User.objects.using('online').create(username='student')
+        self.quiz = create_quiz('default', self.user)
+        self.online_quiz = create_quiz('online', self.online_user, title='Online quiz')
+
+    def test_converter_round_trip(self):
+        converter = ObjectRefConverter()
+        self.assertEqual(converter.to_python('online-12'), ObjectRef('online', 12))
+        self.assertEqual(converter.to_url(ObjectRef('default', 7)), 'local-7')
+        self.assertEqual(converter.to_url(self.online_quiz), f'online-{self.online_quiz.pk}')
+        self.assertEqual(reverse('quiz_detail', args=[self.quiz]), f'/quiz/local-{self.quiz.pk}/')
+
+    def test_refs_with_the_same_pk_open_their_own_quiz(self):
+        self.assertEqual(self.quiz.pk, self.online_quiz.pk)
+        self.assertContains(self.client.get(f'/quiz/online-{self.online_quiz.pk}/'), 'Online quiz')
+        self.assertNotContains(self.client.get(f'/quiz/local-{self.quiz.pk}/'), 'Online quiz')
+        self.assertEqual(self.client.get('/quiz/online-999/').status_code, 404)
+
+    def test_legacy_quiz_url_is_resolved_once_and_recorded(self):
+        response = self.client.get(f'/quiz/{self.quiz.pk}/take/')
+        self.assertRedirects(
+            response, f'/quiz/local-{self.quiz.pk}/take/', status_code=301, fetch_redirect_response=False,
+        )
+        self.assertEqual(LegacyQuizRoute.objects.get(legacy_pk=self.quiz.pk).db_alias, 'default')
+
+        # Deleting the local quiz must not send the old URL to the online one
+        self.quiz.delete()
+        with self.assertNumQueries(1):
+            self.assertEqual(resolve_legacy_quiz(self.online_quiz.pk), ObjectRef('default', self.online_quiz.pk))
+
+    def test_legacy_quiz_url_falls_back_to_online(self):
+        pk = self.online_quiz.pk
+        self.quiz.delete()
+        response = self.client.get(f'/quiz/{pk}/')
+        self.assertRedirects(
+            response, f'/quiz/online-{pk}/', status_code=301, fetch_redirect_response=False,
+        )
+        self.assertEqual(self.client.get('/quiz/999/').status_code, 404)
+
+    def test_legacy_results_url_is_resolved_by_owner(self):
+        online_attempt = create_attempt(self.online_quiz, self.online_user, 1)
+        stranger = User.objects.create(username='stranger')
+        create_attempt(self.quiz, stranger, 1)
+        self.assertEqual(online_attempt.pk, TestAttempt.objects.get().pk)
+        self.client.force_login(self.user)
+
+        response = self.client.get(f'/results/{online_attempt.pk}/')
+
+        self.assertRedirects(
+            response, f'/results/online-{online_attempt.pk}/', status_code=301, fetch_redirect_response=False,
+        )
+        self.assertEqual(self.client.get(f'/results/local-{online_attempt.pk}/').status_code, 404)
 
-# Create your tests here.
@@ -1,9 +1,11 @@
 from django.urls import path
+from . import routing  # noqa: F401 registers the <ref:...> converter
 from .views import (
     MainPageView, CreateQuizView, QuestionCreateView, QuizDetailView,
     TakeQuizView, QuizResultsView, MyQuizesView, DeleteQuiz, MyHistoryView,
     PublishQuizView, ProfileView, ExploreView, UpdateQuizView,
-    UpdateQuestionView, DeleteQuestionView
+    UpdateQuestionView, DeleteQuestionView, DeleteHistoryView, LiveQuizView,
+    QuizStatsView, LegacyQuizRedirectView, LegacyResultsRedirectView
 )
 
 urlpatterns = [
@@ -13,13 +15,21 @@ urlpatterns = [
     path('quiz/<int:pk>/update/', UpdateQuizView.as_view(), name='update_quiz'),
     path('my-quizes/', MyQuizesView.as_view(), name='my_quizes'),
     path('my_history/', MyHistoryView.as_view(), name='my_history'),
+    path('my_history/delete/', DeleteHistoryView.as_view(), name='delete_history'),
     path('profile/', ProfileView.as_view(), name='profile'),
-    path('quiz/<int:pk>/', QuizDetailView.as_view(), name='quiz_detail'),
+    path('quiz/<ref:ref>/', QuizDetailView.as_view(), name='quiz_detail'),
     path('quiz/<int:pk>/add_question/', QuestionCreateView.as_view(), name='add_question'),
     path('question/<int:pk>/update/', UpdateQuestionView.as_view(), name='update_question'),
     path('question/<int:pk>/delete/', DeleteQuestionView.as_view(), name='delete_question'),
-    path('quiz/<int:pk>/take/', TakeQuizView.as_view(), name='take_quiz'),
+    path('quiz/<ref:ref>/take/', TakeQuizView.as_view(), name='take_quiz'),
+    path('quiz/<ref:ref>/live/', LiveQuizView.as_view(), name='live_quiz'),
+    path('quiz/<int:pk>/stats/', QuizStatsView.as_view(), name='quiz_stats'),
     path('quiz/<int:pk>/delete/', DeleteQuiz.as_view(), name='delete_quiz'),
     path('quiz/<int:pk>/publish/', PublishQuizView.as_view(), name='publish_quiz'),
-    path('results/<int:pk>/', QuizResultsView.as_view(), name='quiz_results'),
+    path('results/<ref:ref>/', QuizResultsView.as_view(), name='quiz_results'),
+    # URLs from before quiz and attempt refs, resolved once through LegacyQuizRoute
+    path('quiz/<int:pk>/', LegacyQuizRedirectView.as_view(pattern_name='quiz_detail')),
+    path('quiz/<int:pk>/take/', LegacyQuizRedirectView.as_view(pattern_name='take_quiz')),
+    path('quiz/<int:pk>/live/', LegacyQuizRedirectView.as_view(pattern_name='live_quiz')),
+    path('results/<int:pk>/', LegacyResultsRedirectView.as_view()),
 ]
\ No newline at end of file
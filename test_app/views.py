@@ -6,26 +6,51 @@ from django.views.generic import (
 from django.views.generic.edit import FormView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.urls import reverse_lazy, reverse
-from django.db.models import Count, Sum, Q
-from .models import Quiz, Question, TestAttempt, Category, Choice
+from django.db import transaction
+from django.db.models import Count, Max, Sum, Q
+from .models import Quiz, Question, TestAttempt, Category, RelatedQuiz, AttemptSummary, QuizScoreStats
 from django.contrib.auth.models import User as AuthUser
 from django.contrib.auth.models import User
 from .forms import QuizForm, QuestionForm, ChoiceFormSet, ChoiceUpdateFormSet
-
-class MainPageView(ListView):
+from .mixins import ConditionalGetMixin
+from .deletion import delete_published_copy, delete_quizzes, purge_attempts
+from .popularity import record_attempt
+from .publishing import publish_quiz
+from .reference import get_categories, get_categories_version
+from .routing import ObjectRef, get_object_by_ref, make_ref, resolve_legacy_attempt, resolve_legacy_quiz
+from .scores import combine_score_stats, record_scores
+from .recommendations import RELATED_QUIZZES_LIMIT, get_related_version
+from .snapshots import get_current_snapshot, get_snapshot_content, grade
+
+
+def get_quiz_version(queryset, **extra):
+    # Count catches deletions, which leave Max(updated_at) unchanged, and
+    # the categories version covers the category titles the pages render
+    version = queryset.order_by().aggregate(latest=Max('updated_at'), total=Count('id'), **extra)
+    latest = version.pop('latest')
+    return (
+        f"{queryset.db}:{latest.timestamp() if latest else 0}:{sorted(version.items())}"
+        f":{get_categories_version(queryset.db)}"
+    )
+
+
+def get_feed_db_alias():
+    # The public feed is served from the online database when it is reachable
+    try:
+        Quiz.objects.using('online').exists()
+        return 'online'
+    except Exception as e:
+        print(f"Online DB not available: {e}")
+        return 'default'
+
+
+class MainPageView(ConditionalGetMixin, ListView):
     model = Quiz
     template_name = 'main.html'
     context_object_name = 'quizes'
 
     def get_queryset(self):
-        db_alias = 'default'
-        try:
-            Quiz.objects.using('online').exists()
-            db_alias = 'online'
-        except Exception as e:
-            print(f"Online DB not available: {e}")
-            db_alias = 'default'
-        queryset = Quiz.objects.using(db_alias).all()
+        queryset = Quiz.objects.using(get_feed_db_alias()).all()
         
         category = self.request.GET.get('category')
         query = self.request.GET.get('q')
@@ -39,6 +64,8 @@ class MainPageView(ListView):
             )
         if sort == 'asc':
             queryset = queryset.order_by('date_created')
+        elif sort == 'popular':
+            queryset = queryset.order_by('-popularity', '-date_created')
         else:
             queryset = queryset.order_by('-date_created')
             
@@ -46,14 +73,22 @@ class MainPageView(ListView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        is_online = self.get_queryset()._db == 'online'
+        is_online = self.object_list.db == 'online'
         db_alias = 'online' if is_online else 'default'
-        context['categories'] = Category.objects.using(db_alias).all()
+        context['categories'] = get_categories(db_alias)
         context['selected_category'] = self.request.GET.get('category', '')
         context['search_query'] = self.request.GET.get('q', '')
+        context['selected_sort'] = self.request.GET.get('sort', '')
         context['is_online_mode'] = is_online
         
         return context
+
+    def get_content_version(self):
+        queryset = self.get_queryset()
+        if self.request.GET.get('sort') == 'popular':
+            # Batch popularity updates do not touch updated_at
+            return get_quiz_version(queryset, popularity=Sum('popularity'))
+        return get_quiz_version(queryset)
     
 
 class MyQuizesView(LoginRequiredMixin, ListView):
@@ -62,7 +97,7 @@ class MyQuizesView(LoginRequiredMixin, ListView):
     context_object_name = 'quizes'
 
     def get_queryset(self):
-        queryset = Quiz.objects.filter(user=self.request.user).order_by('-date_created')
+        queryset = Quiz.objects.filter(user=self.request.user).select_related('category').order_by('-date_created')
         
         query = self.request.GET.get('q')
         category_id = self.request.GET.get('category')
@@ -79,7 +114,7 @@ class MyQuizesView(LoginRequiredMixin, ListView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['categories'] = Category.objects.all()
+        context['categories'] = get_categories()
         context['selected_category'] = self.request.GET.get('category')
         context['search_query'] = self.request.GET.get('q', '')
         return context
@@ -88,39 +123,52 @@ class MyHistoryView(LoginRequiredMixin, ListView):
     model = TestAttempt
     template_name = 'my_history.html'
     context_object_name = 'history'
+
+    def get_online_user(self):
+        if not hasattr(self, '_online_user'):
+            try:
+                self._online_user = User.objects.using('online').filter(username=self.request.user.username).first()
+            except Exception:
+                self._online_user = None
+        return self._online_user
     
     def get_queryset(self):
         # Local attempts
-        local_attempts = list(TestAttempt.objects.filter(user=self.request.user))
+        local_attempts = list(TestAttempt.objects.filter(user=self.request.user).select_related('quiz'))
         
         # Online attempts
         online_attempts = []
-        try:
-            online_user = User.objects.using('online').filter(username=self.request.user.username).first()
-            if online_user:
-                online_attempts = list(TestAttempt.objects.using('online').filter(user=online_user))
-        except Exception:
-            pass
+        online_user = self.get_online_user()
+        if online_user:
+            try:
+                online_attempts = list(TestAttempt.objects.using('online').filter(user=online_user).select_related('quiz'))
+            except Exception:
+                pass
             
         # Combine and sort
         all_attempts = local_attempts + online_attempts
         all_attempts.sort(key=lambda x: x.date_taken, reverse=True)
         return all_attempts
 
+    def get_archived_history(self):
+        # Attempts older than the retention period only exist as monthly summaries
+        summaries = list(AttemptSummary.objects.filter(user=self.request.user).select_related('quiz'))
+        online_user = self.get_online_user()
+        if online_user:
+            try:
+                summaries += list(AttemptSummary.objects.using('online').filter(user=online_user).select_related('quiz'))
+            except Exception:
+                pass
+        summaries.sort(key=lambda x: x.month, reverse=True)
+        return summaries
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        curr_user = self.request.user
-        
-        local_count = TestAttempt.objects.filter(user=curr_user).count()
-        online_count = 0
-        try:
-            online_user = User.objects.using('online').filter(username=curr_user.username).first()
-            if online_user:
-                online_count = TestAttempt.objects.using('online').filter(user=online_user).count()
-        except Exception:
-            pass
-            
-        context['count_test'] = {'id__count': local_count + online_count}
+        archived = self.get_archived_history()
+        context['archived_history'] = archived
+        context['count_test'] = {
+            'id__count': len(self.object_list) + sum(summary.attempts for summary in archived)
+        }
         return context
 
 class ProfileView(LoginRequiredMixin, DetailView):
@@ -134,42 +182,8 @@ class PublishQuizView(LoginRequiredMixin, View):
     def post(self, request, pk, *args, **kwargs):
         quiz = get_object_or_404(Quiz, pk=pk, user=request.user)
 
-        online_user, created = User.objects.using('online').get_or_create(
-            username=request.user.username,
-            defaults={
-                'email': request.user.email,
-                'password': request.user.password 
-            }
-        )
-        online_category, _ = Category.objects.using('online').get_or_create(
-            title=quiz.category.title,
-            defaults={'image': quiz.category.image}
-        )
-
         try:
-            online_quiz = Quiz.objects.using('online').create(
-                title=quiz.title,
-                user=online_user,
-                description=quiz.description,
-                category=online_category,
-                public=True, 
-                date_created=quiz.date_created
-            )
-
-            for q in quiz.questions.all():
-                online_q = Question.objects.using('online').create(
-                    quiz=online_quiz, 
-                    text=q.text
-                )
-                for c in q.choices.all():
-                    Choice.objects.using('online').create(
-                        question=online_q, 
-                        text=c.text, 
-                        is_correct=c.is_correct
-                    )
-            
-            quiz.public = True
-            quiz.save()
+            publish_quiz(quiz)
             print(f"Успешно опубликовано в Supabase: {quiz.title}")
             
         except Exception as e:
@@ -187,6 +201,28 @@ class DeleteQuiz(LoginRequiredMixin, DeleteView):
         queryset = queryset.filter(user=self.request.user)
         return queryset
 
+    def form_valid(self, form):
+        quiz = self.object
+        if quiz.public:
+            try:
+                delete_published_copy(quiz)
+            except Exception as e:
+                print(f"Online copy not deleted: {e}")
+        delete_quizzes(quiz._state.db, [quiz.pk])
+        return redirect(self.get_success_url())
+
+
+class DeleteHistoryView(LoginRequiredMixin, View):
+    def post(self, request, *args, **kwargs):
+        purge_attempts('default', request.user.pk)
+        try:
+            online_user = User.objects.using('online').filter(username=request.user.username).first()
+            if online_user:
+                purge_attempts('online', online_user.pk)
+        except Exception:
+            pass
+        return redirect('my_history')
+
 
     
 
@@ -195,7 +231,7 @@ class CreateQuizView(LoginRequiredMixin, CreateView):
     template_name = 'quiz_create.html'
     form_class = QuizForm
     def get(self, request, *args, **kwargs):
-        if not Category.objects.exists():
+        if not get_categories():
             try:
                 online_categories = Category.objects.using('online').all()
                 for cat in online_categories:
@@ -236,6 +272,7 @@ class QuestionCreateView(LoginRequiredMixin, CreateView):
             data['choices'] = ChoiceFormSet(self.request.POST)
         else:
             data['choices'] = ChoiceFormSet()
+        data['quiz_ref'] = ObjectRef('default', self.kwargs['pk'])
         return data
 
     def form_valid(self, form):
@@ -280,33 +317,22 @@ class UpdateQuestionView(LoginRequiredMixin, UpdateView):
             return self.render_to_response(self.get_context_data(form=form))
 
     def get_success_url(self):
-        return reverse_lazy('quiz_detail', kwargs={'pk': self.object.quiz.pk})
+        return reverse_lazy('quiz_detail', kwargs={'ref': self.object.quiz})
 
 class DeleteQuestionView(LoginRequiredMixin, DeleteView):
     model = Question
     template_name = 'delete_confirm.html'
     
     def get_success_url(self):
-        return reverse_lazy('quiz_detail', kwargs={'pk': self.object.quiz.pk})
+        return reverse_lazy('quiz_detail', kwargs={'ref': self.object.quiz})
 
-class QuizDetailView(DetailView):
+class QuizDetailView(ConditionalGetMixin, DetailView):
     model = Quiz
     template_name = 'quiz_detail_view.html'
     context_object_name = 'quiz'
 
     def get_object(self, queryset=None):
-        pk = self.kwargs.get('pk')
-        quiz = Quiz.objects.filter(pk=pk).first()
-        if quiz:
-            return quiz
-        try:
-            quiz = Quiz.objects.using('online').filter(pk=pk).first()
-            if quiz:
-                return quiz
-        except Exception:
-            pass
-            
-        raise Http404("No quiz found matching the query")
+        return get_object_by_ref(Quiz.objects.all(), self.kwargs['ref'])
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -317,8 +343,25 @@ class QuizDetailView(DetailView):
             quiz.questions.using(quiz._state.db).exists()
         )
         context['is_online'] = quiz._state.db == 'online'
+        context['related_quizzes'] = (
+            RelatedQuiz.objects.using(quiz._state.db)
+            .filter(quiz=quiz)
+            .select_related('related')[:RELATED_QUIZZES_LIMIT]
+        )
         return context
 
+    def get_content_version(self):
+        db_alias, pk = self.kwargs['ref']
+        try:
+            updated_at = Quiz.objects.using(db_alias).filter(pk=pk).values_list('updated_at', flat=True).first()
+        except Exception:
+            updated_at = None
+        if updated_at is None:
+            # Let get_object() raise the 404
+            return None
+        related_version = get_related_version(db_alias)
+        return f'{db_alias}:{pk}:{updated_at.timestamp()}:{related_version}'
+
 
 class TakeQuizView(LoginRequiredMixin, DetailView):
     model = Quiz
@@ -326,16 +369,7 @@ class TakeQuizView(LoginRequiredMixin, DetailView):
     context_object_name = 'quiz'
 
     def get_object(self, queryset=None):
-        pk = self.kwargs.get('pk')
-        quiz = Quiz.objects.filter(pk=pk).first()
-        if not quiz:
-            try:
-                quiz = Quiz.objects.using('online').filter(pk=pk).first()
-            except Exception:
-                pass
-        if not quiz:
-            raise Http404("No quiz found matching the query")
-        return quiz
+        return get_object_by_ref(Quiz.objects.all(), self.kwargs['ref'])
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -347,29 +381,13 @@ class TakeQuizView(LoginRequiredMixin, DetailView):
         self.object = self.get_object()
         quiz = self.object
         db_alias = quiz._state.db
-        questions = quiz.questions.using(db_alias).prefetch_related('choices').all()
-        
-        score = 0
-        total = questions.count()
-        user_answers = {}
-
-        for question in questions:
-            answer_key = f'question_{question.id}'
-            selected_choice_id = request.POST.get(answer_key)
-            
-            if selected_choice_id:
-                try:
-                    selected_choice = question.choices.get(id=selected_choice_id)
-                    user_answers[question.id] = {
-                        'selected': selected_choice,
-                        'is_correct': selected_choice.is_correct
-                    }
-                    if selected_choice.is_correct:
-                        score += 1
-                except:
-                    user_answers[question.id] = {'selected': None, 'is_correct': False}
-            else:
-                user_answers[question.id] = {'selected': None, 'is_correct': False}
+        snapshot = get_current_snapshot(quiz)
+        answers = {
+            question['id']: request.POST.get(f"question_{question['id']}")
+            for question in snapshot.content['questions']
+        }
+        score, user_answers = grade(snapshot.content, answers)
+        total = len(snapshot.content['questions'])
 
         # Ensure user exists in the target database
         target_user = request.user
@@ -382,19 +400,36 @@ class TakeQuizView(LoginRequiredMixin, DetailView):
                 }
             )
 
-        attempt = TestAttempt.objects.using(db_alias).create(
-            user=target_user,
-            quiz=quiz,
-            score=score,
-            total_questions=total
-        )
+        # The attempt and the counters it feeds are saved together or not at all
+        with transaction.atomic(using=db_alias):
+            attempt = TestAttempt.objects.using(db_alias).create(
+                user=target_user,
+                quiz=quiz,
+                score=score,
+                total_questions=total,
+                snapshot=snapshot
+            )
+            record_attempt(quiz)
+            record_scores(quiz, [attempt])
 
-        request.session[f'quiz_result_{attempt.id}'] = {
-            'user_answers': {str(k): {'selected_id': v['selected'].id if v['selected'] else None, 'is_correct': v['is_correct']} for k, v in user_answers.items()},
+        request.session[f'quiz_result_{make_ref(db_alias, attempt.pk)}'] = {
+            'user_answers': {str(k): v for k, v in user_answers.items()},
             'db': db_alias
         }
 
-        return redirect('quiz_results', pk=attempt.id)
+        return redirect('quiz_results', ref=attempt)
+
+
+class LiveQuizView(TakeQuizView):
+    # Answers go over the WebSocket in a_server/asgi.py, not through POST
+    template_name = 'live_quiz.html'
+    http_method_names = ['get', 'head', 'options']
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['is_host'] = self.object.user.username == self.request.user.username
+        context['live_ref'] = make_ref(self.object._state.db, self.object.pk)
+        return context
 
 
 class QuizResultsView(LoginRequiredMixin, DetailView):
@@ -403,46 +438,54 @@ class QuizResultsView(LoginRequiredMixin, DetailView):
     context_object_name = 'attempt'
 
     def get_object(self, queryset=None):
-        pk = self.kwargs.get('pk')
-        # Try local DB
-        attempt = TestAttempt.objects.filter(pk=pk, user=self.request.user).first()
-        if attempt:
-            return attempt
-        
-        # Try online DB
-        try:
-            # We need to find the online user first
-            online_user = User.objects.using('online').filter(username=self.request.user.username).first()
-            if online_user:
-                attempt = TestAttempt.objects.using('online').filter(pk=pk, user=online_user).first()
-                if attempt:
-                    return attempt
-        except Exception:
-            pass
-            
-        raise Http404("No attempt found matching the query")
+        ref = self.kwargs['ref']
+        if ref.db_alias == 'online':
+            # Online attempts belong to the online user of the same name
+            attempts = TestAttempt.objects.filter(user__username=self.request.user.username)
+        else:
+            attempts = TestAttempt.objects.filter(user=self.request.user)
+        return get_object_by_ref(attempts, ref)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         attempt = self.object
+
+        session_key = f'quiz_result_{make_ref(attempt._state.db, attempt.pk)}'
+        session_data = self.request.session.get(session_key, {})
+        user_answers_data = session_data.get('user_answers', {})
+        context['quiz_ref'] = ObjectRef(attempt._state.db, attempt.quiz_id)
+
+        content = None
+        if attempt.snapshot_id:
+            content = get_snapshot_content(attempt._state.db, attempt.snapshot_id)
+        if content is None:
+            # Attempts made before snapshots existed are shown against the live quiz
+            return self.get_live_context_data(context, user_answers_data)
+
+        results = []
+        for question in content['questions']:
+            answer_data = user_answers_data.get(str(question['id']), {})
+            selected_id = answer_data.get('selected_id')
+            choices = question['choices']
+            results.append({
+                'question': question,
+                'selected': next((c for c in choices if c['id'] == selected_id), None),
+                'correct': next((c for c in choices if c['is_correct']), None),
+                'is_correct': answer_data.get('is_correct', False)
+            })
+
+        context['results'] = results
+        context['quiz'] = {'pk': attempt.quiz_id, 'title': content['title']}
+        return context
+
+    def get_live_context_data(self, context, user_answers_data):
+        attempt = self.object
+        # Loaded from the attempt's own database
         quiz = attempt.quiz
-        
-        # If quiz not found locally, try online
-        if not Quiz.objects.filter(pk=quiz.pk).exists():
-            try:
-                online_quiz = Quiz.objects.using('online').filter(pk=quiz.pk).first()
-                if online_quiz:
-                    quiz = online_quiz
-            except Exception:
-                pass
 
         db_alias = quiz._state.db
         questions = quiz.questions.using(db_alias).prefetch_related('choices').all()
 
-        session_key = f'quiz_result_{attempt.id}'
-        session_data = self.request.session.get(session_key, {})
-        user_answers_data = session_data.get('user_answers', {})
-
         results = []
         for question in questions:
             answer_data = user_answers_data.get(str(question.id), {})
@@ -468,7 +511,57 @@ class QuizResultsView(LoginRequiredMixin, DetailView):
         context['quiz'] = quiz
         return context
 
-class ExploreView(ListView):
+class LegacyQuizRedirectView(View):
+    """Permanent redirect from an old ``quiz/<pk>/...`` URL to its ref-based replacement."""
+    pattern_name = 'quiz_detail'
+
+    def get(self, request, pk, *args, **kwargs):
+        ref = resolve_legacy_quiz(pk)
+        if ref is None:
+            raise Http404("No quiz found matching the query")
+        return redirect(self.pattern_name, ref=ref, permanent=True)
+
+
+class LegacyResultsRedirectView(LoginRequiredMixin, View):
+    def get(self, request, pk, *args, **kwargs):
+        ref = resolve_legacy_attempt(pk, request.user)
+        if ref is None:
+            raise Http404("No attempt found matching the query")
+        return redirect('quiz_results', ref=ref, permanent=True)
+
+
+class QuizStatsView(LoginRequiredMixin, DetailView):
+    model = Quiz
+    template_name = 'quiz_stats.html'
+    context_object_name = 'quiz'
+
+    def get_queryset(self):
+        return super().get_queryset().filter(user=self.request.user)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        rows = list(QuizScoreStats.objects.filter(quiz=self.object))
+        if self.object.online_pk:
+            # Students mostly take the published copy
+            try:
+                rows += list(QuizScoreStats.objects.using('online').filter(quiz_id=self.object.online_pk))
+            except Exception as e:
+                print(f"Online stats not available: {e}")
+        stats = combine_score_stats(self.object, rows)
+        histogram = stats.score_histogram or []
+        most = max(histogram, default=0) or 1
+        bin_width = 100 // len(histogram) if histogram else 0
+        context['stats'] = stats
+        context['percentiles'] = [(label, stats.get_percentile(fraction)) for label, fraction in (
+            ('25th', 0.25), ('Median', 0.5), ('75th', 0.75), ('90th', 0.9)
+        )]
+        context['histogram'] = [
+            {'label': f'{i * bin_width}-{(i + 1) * bin_width}%', 'count': count, 'width': round(count / most * 100)}
+            for i, count in enumerate(histogram)
+        ]
+        return context
+
+class ExploreView(ConditionalGetMixin, ListView):
     model = Category
     template_name = 'explore.html'
     context_object_name = 'categories'
@@ -476,3 +569,6 @@ class ExploreView(ListView):
     def get_queryset(self):
         return Category.objects.prefetch_related('quiz_set').all()
 
+    def get_content_version(self):
+        return get_quiz_version(Quiz.objects.all())
+